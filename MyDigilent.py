@@ -1,53 +1,99 @@
 import ctypes, time               # import the C compatible data types
 from sys import platform, path    # this is needed to check the OS type and get the PATH
 from os import sep                # OS specific file path separators
-import inspect, numpy as np       # caller function data
+import os, json, struct, math, bisect, hashlib, tempfile, zipfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import numpy as np
+from bytecache import byte_cache
 import dwfconstants as constants
+import sinefit
+import dwfbindings
+from dwfbindings import error, warning
 
-def smooth_impedance_array(data_array, window_size=5):
+# window_size float64 weights per (window, order)
+SAVGOL_CACHE_ENTRIES = 16
+SAVGOL_CACHE_BYTES = 2**20
+
+@byte_cache(SAVGOL_CACHE_BYTES, SAVGOL_CACHE_ENTRIES)
+def _savgol_coeffs(window_size, polyorder):
+    """
+    Savitzky-Golay smoothing weights: the value at the centre of the least-squares
+    polynomial of degree polyorder through window_size points. Read-only, shared
+    between calls with the same (window, order).
+    """
+    x = np.arange(window_size) - window_size // 2
+    coeffs = np.linalg.pinv(np.vander(x, polyorder + 1, increasing=True))[0]
+    coeffs.flags.writeable = False
+    return coeffs
+
+def smooth_impedance_array(data_array, window_size=5, method="moving_average", polyorder=2):
     """
-    Smooths the impedance columns of a [Freq, Zreal, Zimag] array using a pure NumPy 
-    moving average with edge padding to preserve array shape and boundaries.
+    Smooths the impedance columns of a [Freq, Zreal, Zimag] array, or of a stack
+    of them, using a pure NumPy moving average (or Savitzky-Golay filter) with
+    edge padding to preserve array shape and boundaries.
     
     Parameters:
     -----------
     data_array : numpy.ndarray
-        A 2D array of shape (N, 3) where columns are [Frequency, Z_real, Z_imag].
+        A 2D array of shape (N, 3) where columns are [Frequency, Z_real, Z_imag],
+        or a 3D array of shape (B, N, 3) of B such spectra smoothed together.
     window_size : int
         The number of points to average. Must be an odd number (e.g., 3, 5, 7).
+    method : str
+        "moving_average" (running sums, O(N) whatever the window) or "savgol"
+        (least-squares polynomial of degree polyorder over the window).
+    polyorder : int
+        Polynomial degree of the "savgol" method, below window_size.
         
     Returns:
     --------
     smoothed_array : numpy.ndarray
-        A new (N, 3) array with unchanged frequencies and smoothed impedances.
+        A new array of the same shape with frequencies sorted ascending and
+        smoothed impedances.
     """
+    if method not in ("moving_average", "savgol"):
+        raise ValueError(f"unknown smoothing method {method!r}")
+    data_array = np.asarray(data_array, dtype=float)
     # Ensure window_size is valid and odd
     if window_size < 3:
         return data_array.copy()
     if window_size % 2 == 0:
         window_size += 1  # Force it to be odd for symmetric edge padding
-        
-    # 1. Sort the array by frequency (ascending) to ensure valid smoothing
-    # (We make a copy to avoid mutating your original array)
-    sorted_data = data_array[np.argsort(data_array[:, 0])].copy()
-    
-    freqs = sorted_data[:, 0]
-    z_real = sorted_data[:, 1]
-    z_imag = sorted_data[:, 2]
-    
-    # 2. Define the pure NumPy smoothing helper
-    def apply_moving_average(y, w_size):
-        box = np.ones(w_size) / w_size
-        pad_size = w_size // 2
-        y_padded = np.pad(y, (pad_size, pad_size), mode='edge')
-        return np.convolve(y_padded, box, mode='valid')
-        
-    # 3. Apply the smoothing to the real and imaginary columns
-    z_real_smoothed = apply_moving_average(z_real, window_size)
-    z_imag_smoothed = apply_moving_average(z_imag, window_size)
-    
+    if method == "savgol" and polyorder >= window_size:
+        raise ValueError(f"polyorder {polyorder} must be below the window size {window_size}")
+
+    # 1. Sort every spectrum by frequency (ascending); sweeps are usually
+    # already monotonic, then no sort is needed (descending ones are reversed)
+    stack = data_array[np.newaxis] if data_array.ndim == 2 else data_array
+    freqs = stack[:, :, 0]
+    step = np.diff(freqs, axis=1)
+    if np.all(step > 0):
+        sorted_data = stack
+    elif np.all(step < 0):
+        sorted_data = stack[:, ::-1]
+    else:
+        sorted_data = np.take_along_axis(stack, np.argsort(freqs, axis=1)[:, :, np.newaxis], axis=1)
+
+    # 2. Edge padding of the impedance columns, window_size // 2 on both sides
+    pad_size = window_size // 2
+    z = np.pad(sorted_data[:, :, 1:], ((0, 0), (pad_size, pad_size), (0, 0)), mode='edge')
+
+    # 3. Smooth the real and imaginary columns of every spectrum at once
+    if method == "moving_average":
+        # window sums as differences of one running sum
+        sums = np.cumsum(z, axis=1)
+        z_smoothed = np.empty_like(sorted_data[:, :, 1:])
+        z_smoothed[:, 0] = sums[:, window_size - 1]
+        z_smoothed[:, 1:] = sums[:, window_size:] - sums[:, :-window_size]
+        z_smoothed /= window_size
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(z, window_size, axis=1)
+        z_smoothed = windows @ _savgol_coeffs(window_size, polyorder)
+
     # 4. Reconstruct and return the array
-    return np.column_stack((freqs, z_real_smoothed, z_imag_smoothed))
+    smoothed = np.concatenate((sorted_data[:, :, :1], z_smoothed), axis=2)
+    return smoothed[0] if data_array.ndim == 2 else smoothed
 
 def _interp_complex(freqs_src, Z_src, freqs_target):
     """Helper function to interpolate complex impedance logarithmically."""
@@ -92,29 +138,358 @@ class HolderCalibrator:
         # and only fix subtle phase/gain errors, preventing the "shrink".
         safe_Z_meas = np.where(shifted_Z_meas == 0, 1e-9, shifted_Z_meas)
         self.Z_correction_ratio = true_Z_interp / safe_Z_meas
+        self._build_tables()
+
+    @classmethod
+    def from_tables(cls, freqs, additive_shift, Z_correction_ratio, name="Holder"):
+        """Calibrator restored from its correction tables (e.g. a CalibrationStore cache)."""
+        self = cls.__new__(cls)
+        self.name = name
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.additive_shift = float(additive_shift)
+        self.Z_correction_ratio = np.array(Z_correction_ratio, dtype=complex)
+        self._build_tables()
+        return self
+
+    def _build_tables(self):
+        # --- Interpolation tables, built once ---
+        # log-frequency grid and the ratio's slope on every interval, so correct()
+        # only locates the points (searchsorted) and evaluates one line each
+        self.log_freqs = np.log10(self.freqs)
+        self.f_min, self.f_max = self.freqs[0], self.freqs[-1]
+        if len(self.freqs) > 1:
+            step = np.diff(self.log_freqs)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.ratio_slope = np.where(step > 0, np.diff(self.Z_correction_ratio) / step, 0)
+        else:
+            self.ratio_slope = np.zeros(1, dtype=complex)
+        for table in (self.log_freqs, self.Z_correction_ratio, self.ratio_slope):
+            table.flags.writeable = False
+        # plain-Python copies for single points, where numpy's per-call overhead dominates
+        self._log_list = self.log_freqs.tolist()
+        self._ratio_list = self.Z_correction_ratio.tolist()
+        self._slope_list = self.ratio_slope.tolist()
+
+    def ratio(self, freqs):
+        """Correction ratio at in-range frequencies (any shape), log-linear in frequency."""
+        x = np.log10(np.clip(freqs, self.f_min, self.f_max))
+        i = np.clip(np.searchsorted(self.log_freqs, x, side='right') - 1, 0, len(self.ratio_slope) - 1)
+        return self.Z_correction_ratio[i] + self.ratio_slope[i] * (x - self.log_freqs[i])
+
+    def _correct_point(self, freq, Z):
+        """correct() for one scalar point, same tables without array overhead."""
+        if not (self.f_min <= freq <= self.f_max):
+            return Z.real, Z.imag
+        x = math.log10(freq)
+        i = min(max(bisect.bisect_right(self._log_list, x) - 1, 0), len(self._slope_list) - 1)
+        Z = (Z - self.additive_shift) * (self._ratio_list[i] + self._slope_list[i] * (x - self._log_list[i]))
+        return Z.real, Z.imag
 
     def correct(self, freqs, Z_real, Z_imag):
-        """Corrects a new measurement using both Shift and Ratio."""
+        """
+        Corrects a new measurement using both Shift and Ratio.
+        freqs, Z_real and Z_imag broadcast together, so a whole sweep (or a
+        batch of archived sweeps) is corrected in one call.
+        """
+        if np.ndim(freqs) == 0 and np.ndim(Z_real) == 0 and np.ndim(Z_imag) == 0:
+            return self._correct_point(float(freqs), complex(float(Z_real), float(Z_imag)))
+
         freqs = np.atleast_1d(np.asarray(freqs,  dtype=float))
         Z_raw = np.atleast_1d(np.asarray(Z_real, dtype=float)) \
               + 1j * np.atleast_1d(np.asarray(Z_imag, dtype=float))
 
-        in_range = (freqs >= self.freqs.min()) & (freqs <= self.freqs.max())
-        Z_out    = Z_raw.copy()
+        in_range = (freqs >= self.f_min) & (freqs <= self.f_max)
 
-        if in_range.any():
-            # 1. Subtract the additive series resistance of the cables
-            Z_out[in_range] = Z_out[in_range] - self.additive_shift
-            
-            # 2. Multiply by the phase/gain correction ratio
-            ratio_at_freqs = _interp_complex(self.freqs, self.Z_correction_ratio, freqs[in_range])
-            Z_out[in_range] = Z_out[in_range] * ratio_at_freqs
+        # 1. Subtract the additive series resistance of the cables
+        # 2. Multiply by the phase/gain correction ratio
+        # (out-of-range points pass through unchanged)
+        Z_out = np.where(in_range, (Z_raw - self.additive_shift) * self.ratio(freqs), Z_raw)
 
-        if len(freqs) == 1:
-            return float(Z_out.real[0]), float(Z_out.imag[0])
+        if Z_out.size == 1:
+            return float(Z_out.real.flat[0]), float(Z_out.imag.flat[0])
             
         return Z_out.real, Z_out.imag
 
+class CalibratorBank:
+    """
+    N HolderCalibrators applied together. Their correction ratios are resampled
+    onto the union of their log-frequency grids (exact, the ratios are linear
+    between their own grid points), so the shifts, ratios and slopes stack
+    into (N,) and (N, grid) tables and every cell is located with one
+    searchsorted. A None entry leaves its cell uncorrected.
+    """
+    def __init__(self, calibrators):
+        self.calibrators = list(calibrators)
+        self.names = [c.name if c is not None else None for c in self.calibrators]
+        present = [c for c in self.calibrators if c is not None]
+        n = len(self.calibrators)
+
+        self.log_freqs = np.unique(np.concatenate([c.log_freqs for c in present])) if present else np.zeros(1)
+        grid = 10 ** self.log_freqs
+        self.additive_shift = np.zeros(n)
+        # an empty range (min > max) never matches, None cells pass through
+        self.f_min = np.full(n, np.inf)
+        self.f_max = np.full(n, -np.inf)
+        ratios = np.ones((n, len(self.log_freqs)), dtype=complex)
+        for k, c in enumerate(self.calibrators):
+            if c is not None:
+                self.additive_shift[k] = c.additive_shift
+                self.f_min[k], self.f_max[k] = c.f_min, c.f_max
+                ratios[k] = c.ratio(grid)
+        self.Z_correction_ratio = ratios
+        self.grid_min, self.grid_max = grid[0], grid[-1]
+        if len(self.log_freqs) > 1:
+            self.ratio_slope = np.diff(ratios, axis=1) / np.diff(self.log_freqs)
+        else:
+            self.ratio_slope = np.zeros((n, 1), dtype=complex)
+        for table in (self.log_freqs, self.additive_shift, self.f_min, self.f_max, self.Z_correction_ratio, self.ratio_slope):
+            table.flags.writeable = False
+        self._log_list = self.log_freqs.tolist()
+
+    def __len__(self):
+        return len(self.calibrators)
+
+    def _correct_freq(self, freq, Z_raw):
+        """correct() at one scalar frequency: located once, only the cells are vectorized."""
+        x = math.log10(min(max(freq, self.grid_min), self.grid_max))
+        i = min(max(bisect.bisect_right(self._log_list, x) - 1, 0), self.ratio_slope.shape[1] - 1)
+        ratio = self.Z_correction_ratio[:, i] + self.ratio_slope[:, i] * (x - self._log_list[i])
+        if Z_raw.ndim > 1:
+            ratio = ratio.reshape((-1,) + (1,) * (Z_raw.ndim - 1))
+        in_range = self.in_range(freq)
+        Z_out = np.where(in_range.reshape(ratio.shape), (Z_raw - self.additive_shift.reshape(ratio.shape)) * ratio, Z_raw)
+        return Z_out.real, Z_out.imag
+
+    def in_range(self, freq):
+        """(N,) True for the cells whose calibration covers freq."""
+        return (self.f_min <= freq) & (freq <= self.f_max)
+
+    def correct(self, freqs, Z_real, Z_imag):
+        """
+        Corrects the impedances of all N cells in one call.
+        Z_real, Z_imag: (N,) one point per cell, or (N, n_freq) whole sweeps;
+        freqs broadcasts against them: a scalar, (N,) per cell, (n_freq,) or
+        (N, n_freq). Always returns arrays shaped like Z, where row k equals
+        calibrators[k].correct on that row (floats there for one point).
+        """
+        Z_raw = np.asarray(Z_real, dtype=float) + 1j * np.asarray(Z_imag, dtype=float)
+        if np.ndim(freqs) == 0:
+            return self._correct_freq(float(freqs), Z_raw)
+        freqs = np.asarray(freqs, dtype=float)
+        # cell index of every element, broadcast over the frequency axis
+        k = np.arange(len(self.calibrators)).reshape((-1,) + (1,) * (Z_raw.ndim - 1))
+
+        in_range = (freqs >= self.f_min[k]) & (freqs <= self.f_max[k])
+        x = np.log10(np.clip(freqs, self.grid_min, self.grid_max))
+        i = np.clip(np.searchsorted(self.log_freqs, x, side='right') - 1, 0, self.ratio_slope.shape[1] - 1)
+        ratio = self.Z_correction_ratio[k, i] + self.ratio_slope[k, i] * (x - self.log_freqs[i])
+
+        # 1. shift, 2. ratio, per cell; out-of-range points pass through unchanged
+        Z_out = np.where(in_range, (Z_raw - self.additive_shift[k]) * ratio, Z_raw)
+        return Z_out.real, Z_out.imag
+
+def _atomic_write(path, write, mode="wb"):
+    """
+    Replaces the file at path with what write(file) puts into a fresh temporary
+    file beside it: a crash never leaves a truncated file, and concurrent writers
+    (e.g. the devices of a device_pool) never share a temporary name. Used for
+    caches, so an OSError only means the file is not written.
+
+    Returns
+    -------
+    True if the file was replaced
+    """
+    directory = os.path.dirname(path) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(mode, dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    except OSError:
+        return False
+    try:
+        with file:
+            write(file)
+        os.replace(file.name, path)
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            os.remove(file.name)   # only left behind when the write failed
+        except OSError:
+            pass
+
+# smoothed holder sweeps and correction tables, rebuilt when their inputs change
+CALIBRATION_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "mydigilent", "calibration")
+CALIBRATION_FORMAT = 1   # bump when the cached tables change meaning
+
+class CalibrationStore:
+    """
+    Holder calibrations on file: <name>.ref.csv (reference sweep) and
+    <name>.meas.csv (sweep measured through the holder), columns
+    [Freq, Zreal, Zimag]. Only the names are listed up front; a calibrator is
+    built on first use, from a cached .npz of its smoothed sweep and correction
+    tables when one exists for the current content hash of its inputs, else
+    from the files (smooth_impedance_array + HolderCalibrator) and then cached.
+    """
+    def __init__(self, directory, cache_dir=CALIBRATION_CACHE, window_size=5):
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self.window_size = window_size
+        files = set(os.listdir(directory))
+        self.names = sorted(f[:-len(".ref.csv")] for f in files
+                            if f.endswith(".ref.csv") and f[:-len(".ref.csv")] + ".meas.csv" in files)
+        self.calibrators = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def paths(self, name):
+        return (os.path.join(self.directory, name + ".ref.csv"),
+                os.path.join(self.directory, name + ".meas.csv"))
+
+    def key(self, name):
+        """
+        content hash of a holder's inputs: both files, the smoothing window and
+        the cache format
+        """
+        digest = hashlib.sha1(f"{CALIBRATION_FORMAT}:{self.window_size}".encode())
+        for path in self.paths(name):
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        return digest.hexdigest()[:16]
+
+    def get(self, name):
+        """
+        the HolderCalibrator of a holder, loaded once
+        """
+        calibrator = self.calibrators.get(name)
+        if calibrator is not None:
+            return calibrator
+        if name not in self.names:
+            raise KeyError(f"no calibration files for {name!r} in {self.directory}")
+
+        cache = os.path.join(self.cache_dir, f"{name}-{self.key(name)}.npz")
+        try:
+            with np.load(cache) as tables:
+                calibrator = HolderCalibrator.from_tables(tables["freqs"], tables["additive_shift"],
+                                                          tables["Z_correction_ratio"], name=name)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            ref_path, meas_path = self.paths(name)
+            ref = np.loadtxt(ref_path, delimiter=",", ndmin=2)
+            smoothed = smooth_impedance_array(np.loadtxt(meas_path, delimiter=",", ndmin=2), window_size=self.window_size)
+            calibrator = HolderCalibrator(ref, smoothed, name=name)
+            self.save(cache, name, smoothed, calibrator)
+        self.calibrators[name] = calibrator
+        return calibrator
+
+    def save(self, cache, name, smoothed, calibrator):
+        written = _atomic_write(cache, lambda file: np.savez(file, smoothed=smoothed, freqs=calibrator.freqs,
+                                                             additive_shift=calibrator.additive_shift,
+                                                             Z_correction_ratio=calibrator.Z_correction_ratio))
+        if not written:
+            return
+        # tables of older inputs of this holder are stale now
+        for stale in os.listdir(self.cache_dir):
+            if stale.startswith(name + "-") and stale.endswith(".npz") and len(stale) == len(name) + 21 \
+                    and os.path.join(self.cache_dir, stale) != cache:
+                try:
+                    os.remove(os.path.join(self.cache_dir, stale))
+                except OSError:
+                    pass  # already removed by another store
+
+    def bank(self, names=None):
+        """
+        CalibratorBank of the given holders (all on file if None), in that order
+        """
+        return CalibratorBank([self.get(name) for name in (self.names if names is None else names)])
+
+class impedance_engine:
+    """
+        impedances of K cells measured against one shared current channel.
+        A capture is a (1 + K, n) block: row 0 the voltage across the current
+        shunt, rows 1..K the cell voltages. Every step, calibration included
+        (CalibratorBank), runs on all cells at once, and the results are
+        written into the preallocated (K, n_freq, 6) samples tensor, one row
+        per frequency:
+        [DC voltage, log10(f), Z real, -Z imag, |Z|, phase (deg)]
+    """
+    def __init__(self, calibrators, n_freq, shunt=0.033):
+        self.calibrators = list(calibrators)    # one HolderCalibrator (or None) per cell
+        self.bank = CalibratorBank(self.calibrators)
+        self.cells = len(self.calibrators)
+        self.shunt = shunt                      # current shunt (ohm)
+        self.samples = np.zeros((self.cells, n_freq, 6))
+
+    def reset(self):
+        """
+            clears the samples tensor for a new sweep
+        """
+        self.samples[:] = 0
+
+    def prepare(self, record):
+        """
+            parameters: - record: (1 + K, n) capture
+
+            return:     - the capture with every channel's mean removed
+                        - (1 + K,) mean (DC) of every channel
+        """
+        record = np.asarray(record, dtype=float)
+        dc = record.mean(axis=1)
+        return record - dc[:, None], dc
+
+    def impedance(self, amps, phases):
+        """
+            parameters: - amps, phases: (1 + K,) demodulated amplitudes and phases (rad)
+                          of the shunt voltage and the K cell voltages
+
+            return:     - (K,) complex impedances V / I, with I = -V_shunt / shunt
+                          (the shunt voltage is measured inverted)
+        """
+        phasors = np.asarray(amps) * np.exp(1j * np.asarray(phases))
+        return phasors[1:] / (-phasors[0] / self.shunt)
+
+    def correct(self, freq, Z):
+        """
+            return:     - (K,) real and (K,) imaginary parts of the calibrated impedances,
+                          the imaginary part sign-flipped (-Z imag) as the calibrators expect
+        """
+        # every cell in one call
+        return self.bank.correct(freq, Z.real, -Z.imag)
+
+    def dropped(self, row, Z_real):
+        """
+            data quality check: True if any cell's real part is negative and
+            below 0.98 times column 1 of its previous row
+        """
+        if row == 0:
+            return False
+        return bool(np.any((Z_real < 0.98 * self.samples[:, row - 1, 1]) & (Z_real < 0)))
+
+    def record(self, row, freq, Z_real, Z_imag, dc):
+        """
+            writes one frequency row of every cell into the samples tensor
+
+            parameters: - row: frequency index
+                        - freq: measured frequency (Hz)
+                        - Z_real, Z_imag: (K,) calibrated impedance, Z_imag sign-flipped
+                        - dc: (1 + K,) channel means from prepare()
+        """
+        Z = Z_real - 1j * Z_imag
+        rows = self.samples[:, row]
+        rows[:, 0] = dc[1:]
+        rows[:, 1] = np.log10(freq)
+        rows[:, 2] = Z_real
+        rows[:, 3] = Z_imag
+        rows[:, 4] = np.abs(Z)
+        rows[:, 5] = np.angle(Z, deg=True)
+        return rows
+
 def fir_bandpass(signal, fs, f_low, f_high, num_taps=None):
     """
     Zero-phase FIR bandpass filter using windowed sinc method.
@@ -122,7 +497,7 @@ def fir_bandpass(signal, fs, f_low, f_high, num_taps=None):
 
     Parameters
     ----------
-    signal   : 1D array
+    signal   : 1D array, or a (channels, n) block filtered row by row
     fs       : sampling rate (Hz)
     f_low    : lower cutoff (Hz)
     f_high   : upper cutoff (Hz)
@@ -130,47 +505,220 @@ def fir_bandpass(signal, fs, f_low, f_high, num_taps=None):
 
     Returns
     -------
-    filtered : filtered signal (same length as input, zero-phase)
+    filtered : filtered signal (same shape as input, zero-phase)
     """
-    if num_taps is None:
+    # taps are shared with every other call at the same (fs, f_low, f_high, num_taps)
+    return _filter_bank(signal, fs, f_low, f_high, num_taps)
+
+# taps of two 31-point sweeps; a kernel is at most a few kB
+FIR_CACHE_ENTRIES = 64
+FIR_CACHE_BYTES = 2**20
+# direct convolution below this many multiply-adds per channel (kernel length x
+# samples), FFT overlap-save above; see 'python benchmarks.py fir'
+FIR_DIRECT_WORK = 2**17
+
+class filter_bank:
+    """
+        zero-phase windowed-sinc bandpass filters, the taps cached per
+        (fs, f_low, f_high, num_taps); a (channels, n) block is filtered in
+        one call, by direct or FFT overlap-save convolution depending on size
+    """
+    def __init__(self, direct_work=FIR_DIRECT_WORK):
+        self.direct_work = direct_work
+
+    @staticmethod
+    def default_taps(n):
         # Rule of thumb: longer taps = sharper cutoff, but need signal > 3×taps
-        num_taps = min(len(signal) // 3, 63)
+        num_taps = min(n // 3, 63)
         num_taps = num_taps if num_taps % 2 == 1 else num_taps - 1
-        num_taps = max(num_taps, 7)   # absolute minimum
-
-    nyq  = fs / 2.0
-    fl_n = f_low  / nyq   # normalised [0, 1]
-    fh_n = f_high / nyq
-
-    # Sinc kernel for bandpass = highpass(fl) - lowpass(fh) combined
-    M    = (num_taps - 1) / 2
-    n    = np.arange(num_taps) - M
-
-    # Avoid division by zero at n=0
-    with np.errstate(invalid='ignore'):
-        h_low  = np.where(n == 0, 2 * fl_n,
-                          np.sin(2 * np.pi * fl_n * n) / (np.pi * n))
-        h_high = np.where(n == 0, 2 * fh_n,
-                          np.sin(2 * np.pi * fh_n * n) / (np.pi * n))
-
-    # Bandpass = high_cutoff_lowpass - low_cutoff_lowpass
-    h = h_high - h_low
-
-    # Apply Hann window to reduce spectral leakage
-    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(num_taps) / (num_taps - 1))
-    h     *= window
-    h     /= np.sum(h)   # normalise gain to unity in passband
-
-    # Zero-phase filtering: convolve forward then reverse
-    # Equivalent to scipy filtfilt — eliminates phase distortion
-    pad    = num_taps * 3
-    padded = np.pad(signal, pad, mode='reflect')
-    fwd    = np.convolve(padded, h, mode='same')
-    rev    = np.convolve(fwd[::-1], h, mode='same')[::-1]
-
-    # Trim padding
-    filtered = rev[pad:-pad]
-    return filtered
+        return max(num_taps, 7)   # absolute minimum
+
+    @staticmethod
+    def design(fs, f_low, f_high, num_taps):
+        """
+            returns the Hann-windowed sinc bandpass taps, unity passband gain
+        """
+        nyq  = fs / 2.0
+        fl_n = f_low  / nyq   # normalised [0, 1]
+        fh_n = f_high / nyq
+
+        # Sinc kernel for bandpass = highpass(fl) - lowpass(fh) combined
+        M    = (num_taps - 1) / 2
+        n    = np.arange(num_taps) - M
+
+        # Avoid division by zero at n=0
+        with np.errstate(invalid='ignore'):
+            h_low  = np.where(n == 0, 2 * fl_n,
+                              np.sin(2 * np.pi * fl_n * n) / (np.pi * n))
+            h_high = np.where(n == 0, 2 * fh_n,
+                              np.sin(2 * np.pi * fh_n * n) / (np.pi * n))
+
+        # Bandpass = high_cutoff_lowpass - low_cutoff_lowpass
+        h = h_high - h_low
+
+        # Apply Hann window to reduce spectral leakage
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(num_taps) / (num_taps - 1))
+        h     *= window
+        h     /= np.sum(h)   # normalise gain to unity in passband
+        return h
+
+    @staticmethod
+    def kernel(fs, f_low, f_high, num_taps):
+        """
+            returns the read-only zero-phase kernel h * h (2 * num_taps - 1 taps):
+            the taps are symmetric, so filtering forward then reverse with h is
+            one convolution with h * h
+        """
+        return _fir_kernel(float(fs), float(f_low), float(f_high), int(num_taps))
+
+    @staticmethod
+    def overlap_save(x, h):
+        """
+            'valid' convolution of every row of x with h, FFT blocks of a few
+            kernel lengths so the cost stays linear in the number of samples
+        """
+        K = h.size
+        n_out = x.shape[-1] - K + 1
+        nfft = _fast_length(max(8 * K, 256))
+        step = nfft - K + 1
+        n_blocks = -(-n_out // step)
+        padded = np.zeros(x.shape[:-1] + ((n_blocks - 1) * step + nfft,))
+        padded[..., :x.shape[-1]] = x
+        blocks = np.lib.stride_tricks.sliding_window_view(padded, nfft, axis=-1)[..., ::step, :]
+        H = np.fft.rfft(h, nfft)
+        y = np.fft.irfft(np.fft.rfft(blocks, axis=-1) * H, nfft, axis=-1)[..., K - 1:]
+        return y.reshape(x.shape[:-1] + (-1,))[..., :n_out]
+
+    def __call__(self, signal, fs, f_low, f_high, num_taps=None):
+        """
+            parameters: - signal: samples, (n,) or (channels, n)
+                        - fs: sampling rate (Hz)
+                        - f_low, f_high: cutoffs (Hz)
+                        - num_taps: filter length (odd integer), None for the default
+
+            return:     - the zero-phase filtered signal, same shape as the input
+        """
+        x = np.asarray(signal, dtype=float)
+        n = x.shape[-1]
+        if num_taps is None:
+            num_taps = self.default_taps(n)
+        h2 = self.kernel(fs, f_low, f_high, num_taps)
+
+        # Zero-phase filtering over a reflect-padded copy, equivalent to scipy
+        # filtfilt; only the kernel half-length of padding reaches the output
+        half = num_taps - 1
+        padded = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(half, half)], mode='reflect')
+        if h2.size * n <= self.direct_work:
+            rows = padded.reshape(-1, padded.shape[-1])
+            filtered = np.stack([np.convolve(row, h2, mode='valid') for row in rows])
+            return filtered.reshape(x.shape)
+        return self.overlap_save(padded, h2)
+
+@byte_cache(FIR_CACHE_BYTES, FIR_CACHE_ENTRIES)
+def _fir_kernel(fs, f_low, f_high, num_taps):
+    h = filter_bank.design(fs, f_low, f_high, num_taps)
+    h2 = np.convolve(h, h)
+    h2.flags.writeable = False
+    return h2
+
+_filter_bank = filter_bank()
+
+# polyphase matrices of a sweep's factors, (DECIMATE_TAPS + 1) * factor taps each
+DECIMATE_CACHE_ENTRIES = 32
+DECIMATE_CACHE_BYTES = 16 * 2**20
+# anti-alias taps per polyphase branch, the lowpass spans DECIMATE_TAPS periods of the output rate
+DECIMATE_TAPS = 8
+
+def decimation_factor(signal_freq, sample_rate, samples_per_period=1024):
+    """
+    Largest integer factor that keeps at least samples_per_period samples per
+    period of signal_freq; 1 when the capture is already that coarse or
+    samples_per_period is None.
+    """
+    if not samples_per_period:
+        return 1
+    return max(1, int(sample_rate / (signal_freq * samples_per_period)))
+
+class decimator:
+    """
+        polyphase FIR decimator, the Hann-windowed sinc anti-alias taps cached
+        per (factor, taps per branch); the taps are centred on every kept
+        sample, so output m is the input at index m * factor with no filter
+        delay, and the DC gain is one
+    """
+    def __init__(self, taps=DECIMATE_TAPS):
+        self.taps = taps
+
+    def num_taps(self, factor):
+        # odd, so the window is centred on a sample
+        return 2 * (self.taps * factor // 2) + 1
+
+    def kernel(self, factor):
+        """
+            returns the read-only (taps + 1, factor) polyphase matrix: row j holds
+            the taps applied to input block j of the factor-long blocks under the
+            window (taps * factor + 1 taps, zero padded to whole blocks)
+        """
+        return _polyphase(int(factor), int(self.taps))
+
+    def gain(self, signal_freq, sample_rate, factor):
+        """
+            amplitude response of the anti-alias filter at signal_freq (real, the
+            taps are symmetric); divide demodulated amplitudes by it
+        """
+        if factor <= 1:
+            return 1.0
+        h = self.kernel(factor).ravel()[:self.num_taps(factor)]
+        n = np.arange(h.size) - (h.size - 1) / 2
+        return float(h @ np.cos(2 * np.pi * signal_freq / sample_rate * n))
+
+    def __call__(self, signal, factor):
+        """
+            parameters: - signal: samples, (n,) or (channels, n)
+                        - factor: integer decimation factor
+
+            return:     - samples at sample_rate / factor, (ceil(n / factor),) or
+                          (channels, ceil(n / factor)); output m is centred on input m * factor
+        """
+        x = np.asarray(signal, dtype=float)
+        if factor <= 1:
+            return x
+        n = x.shape[-1]
+        n_out = -(-n // factor)
+        polyphase = self.kernel(factor)
+        # reflect-pad half the window in front, and behind up to whole blocks
+        half = self.num_taps(factor) // 2
+        after = (n_out + self.taps) * factor - n - half
+        padded = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(half, after)], mode='reflect')
+        blocks = padded.reshape(x.shape[:-1] + (n_out + self.taps, factor))
+        # one (n_out, factor) @ (factor,) product per branch: N * taps multiply-adds
+        y = blocks[..., :n_out, :] @ polyphase[0]
+        for j in range(1, self.taps + 1):
+            y += blocks[..., j:j + n_out, :] @ polyphase[j]
+        return y
+
+@byte_cache(DECIMATE_CACHE_BYTES, DECIMATE_CACHE_ENTRIES)
+def _polyphase(factor, taps):
+    # odd, so the window is centred on a sample (decimator.num_taps)
+    num_taps = 2 * (taps * factor // 2) + 1
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    # cutoff at the output Nyquist frequency, 0.5 / factor cycles per input sample
+    h = np.sinc(n / factor) * np.hanning(num_taps)
+    h /= np.sum(h)
+    polyphase = np.zeros((taps + 1) * factor)
+    polyphase[:num_taps] = h
+    polyphase = polyphase.reshape(taps + 1, factor)
+    polyphase.flags.writeable = False
+    return polyphase
+
+_decimator = decimator()
+
+def decimate(signal, factor):
+    """
+    Anti-alias filter and keep every factor-th sample of a (n,) or (channels, n)
+    signal; output m is aligned with input m * factor (no filter delay).
+    """
+    return _decimator(signal, factor)
 
 def dual_phase_demod(y_buffer, signal_freq, sample_rate):
     """
@@ -185,56 +733,276 @@ def dual_phase_demod(y_buffer, signal_freq, sample_rate):
     Returns:
     magnitude (float), phase_deg (float)
     """
-    n = len(y_buffer)
-    t = np.arange(n) / sample_rate
-    
-    # 1. Generate local Reference (Sine) and Quadrature (Cosine) waves
-    # Note: 2*pi*f*t ensures we are perfectly in sync with the source frequency
-    ref_i = np.sin(2 * np.pi * signal_freq * t)
-    ref_q = np.cos(2 * np.pi * signal_freq * t)
-    
-    # 2. Multiply (Demodulation)
-    # This creates a DC component proportional to the phase/amp
-    # and a 2*omega component
-    mixed_i = y_buffer * ref_i
-    mixed_q = y_buffer * ref_q
-    
-    # 3. Low Pass Filter (Average)
-    # Taking the mean over an integer number of cycles acts as a 
-    # perfect low-pass filter, removing the 2*omega component.
-    X = np.mean(mixed_i)
-    Y = np.mean(mixed_q)
-    
-    # 4. Extract Magnitude and Phase
-    # Multiplying by 2 accounts for the 1/2 factor in trig identities
-    magnitude = 2 * np.sqrt(X**2 + Y**2)
-    
-    # Phase shift relative to the reference sine wave
-    phase_rad = np.arctan2(Y, X)
-    
-    return magnitude, phase_rad
+    return _demodulator(y_buffer, signal_freq, sample_rate)
 
-def clean_buffer(y_buffer, signal_freq, sample_rate):
-    # 1. Synthesize the Time Vector based on indices
-    # t = [0, 1/fs, 2/fs, ..., N/fs]
-    n_samples = len(y_buffer)
-    t = np.arange(n_samples) / sample_rate
-    
-    # 2. Create Design Matrix
-    omega = 2 * np.pi * signal_freq
-    # Solves for: y = a*sin(wt) + b*cos(wt) + c
-    M = np.vstack([
-        np.sin(omega * t), 
-        np.cos(omega * t), 
-        np.ones(n_samples)
-    ]).T
-    
-    # 3. Least Squares Fit
-    coeffs, _, _, _ = np.linalg.lstsq(M, y_buffer, rcond=None)
-    a, b, c = coeffs
+class demodulator:
+    """
+        dual-phase synchronous demodulator: the sine/cosine references are built
+        once per call and a (channels, n) block is demodulated with one matrix
+        product. They are not kept, the server demodulates at the re-estimated
+        frequency, which never repeats
+    """
+    @staticmethod
+    def reference(n, signal_freq, sample_rate):
+        """
+            returns the (n, 2) [sin, cos] reference matrix
+        """
+        t = np.arange(n) / sample_rate
+        # Note: 2*pi*f*t ensures we are perfectly in sync with the source frequency
+        refs = np.empty((n, 2))
+        refs[:, 0] = np.sin(2 * np.pi * signal_freq * t)
+        refs[:, 1] = np.cos(2 * np.pi * signal_freq * t)
+        return refs
+
+    def __call__(self, y_buffer, signal_freq, sample_rate):
+        """
+            parameters: - y_buffer: samples, (n,) or (channels, n)
+                        - signal_freq: frequency of the perturbation (Hz)
+                        - sample_rate: sampling rate (Hz)
+
+            return:     - magnitude, phase (rad, relative to the sine reference);
+                          floats for a 1-D buffer, (channels,) arrays for a block
+        """
+        y = np.asarray(y_buffer, dtype=float)
+        n = y.shape[-1]
+        # mixing and averaging over an integer number of cycles in one product:
+        # the mean of y*sin and y*cos for every channel
+        X, Y = np.moveaxis(y @ self.reference(n, signal_freq, sample_rate) / n, -1, 0)
+        # Multiplying by 2 accounts for the 1/2 factor in trig identities
+        return 2 * np.hypot(X, Y), np.arctan2(Y, X)
+
+_demodulator = demodulator()
+
+class lockin:
+    """
+        streaming dual-phase lock-in: fed chunks of samples as they arrive, it
+        keeps the oscillator phase and running sums per channel, so memory does
+        not grow with the capture length. The result after the last chunk equals
+        the demodulator on the whole buffer (with its mean removed if remove_mean)
+    """
+    def __init__(self, signal_freq, sample_rate, channels=1, remove_mean=False):
+        self.signal_freq = float(signal_freq)
+        self.sample_rate = float(sample_rate)
+        self.remove_mean = remove_mean
+        # exp(j 2 pi f k / fs) for k < the longest chunk so far, shorter chunks use a prefix
+        self.oscillator = np.empty(0, dtype=complex)
+        self.reset(channels)
+
+    def reset(self, channels=None):
+        """
+            clears the sums and restarts the oscillator at sample 0
+        """
+        if channels is not None:
+            self.channels = channels
+        self.index = 0                                      # next sample index
+        self.count = 0                                      # samples accumulated
+        self.mixed = np.zeros(self.channels, dtype=complex) # sum of y * exp(j wt)
+        self.total = np.zeros(self.channels)                # sum of y
+        self.reference = 0j                                 # sum of exp(j wt)
+        self.previous = None
+        self.change = np.inf
+
+    def update(self, chunk, start=None):
+        """
+            parameters: - chunk: new samples, (m,) or (channels, m)
+                        - start: sample index of the chunk's first sample; None
+                          continues behind the previous chunk (pass it to skip lost samples)
+
+            return:     - magnitude, phase (rad): the estimate so far, floats for a single
+                          channel, (channels,) arrays otherwise
+                        - change: largest relative change of any channel's phasor over
+                          this chunk (the convergence estimate), inf after the first chunk
+        """
+        y = np.asarray(chunk, dtype=float).reshape(self.channels, -1)
+        m = y.shape[1]
+        if start is not None:
+            self.index = start
+        if m > self.oscillator.size:
+            self.oscillator = np.exp(2j * np.pi * self.signal_freq / self.sample_rate * np.arange(m))
+        # oscillator phase at the first sample, in cycles reduced to [0, 1) to keep precision
+        rotation = np.exp(2j * np.pi * ((self.signal_freq * self.index / self.sample_rate) % 1.0))
+        oscillator = self.oscillator[:m]
+
+        self.mixed += rotation * (y @ oscillator)
+        if self.remove_mean:
+            self.total += y.sum(axis=1)
+            self.reference += rotation * oscillator.sum()
+        self.index += m
+        self.count += m
+
+        magnitude, phase = self.result()
+        phasor = magnitude * np.exp(1j * phase)
+        if self.previous is not None:
+            self.change = np.max(np.abs(phasor - self.previous) / np.maximum(np.abs(phasor), np.finfo(float).tiny))
+        self.previous = phasor
+        return magnitude, phase, self.change
+
+    def update_record(self, record):
+        """
+            feeds a whole (channels, n) record, every run of samples without NaN
+            (scope_stream's lost samples) as a chunk at its own index
+
+            return:     - magnitude, phase (rad), see result()
+        """
+        record = np.asarray(record, dtype=float).reshape(self.channels, -1)
+        valid = ~np.isnan(record).any(axis=0)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], valid.astype(np.int8), [0]))))
+        for first, stop in zip(edges[::2], edges[1::2]):
+            self.update(record[:, first:stop], first)
+        return self.result()
+
+    def result(self):
+        """
+            return:     - magnitude, phase (rad, relative to the sine reference) of the
+                          samples accumulated so far
+        """
+        mixed = self.mixed
+        if self.remove_mean:
+            mixed = mixed - self.total / self.count * self.reference
+        # mean of y*sin (imaginary part) and y*cos (real part)
+        X, Y = mixed.imag / self.count, mixed.real / self.count
+        magnitude, phase = 2 * np.hypot(X, Y), np.arctan2(Y, X)
+        if self.channels == 1:
+            return float(magnitude[0]), float(phase[0])
+        return magnitude, phase
+
+PERIOD_TARGET = 1e-3
+
+class period_lockin:
+    """
+        per-period lock-in for early stopping: every complete period of the
+        chunks it is fed is fitted with a sine on its own, and the
+        per-period phasors are combined with a robust estimator. Channel 0 is
+        the reference (the current); a measurement has converged once the
+        confidence interval of every other channel's ratio to it, relative to
+        the ratio, is below target
+    """
+    def __init__(self, signal_freq, sample_rate, channels=2, estimator="median", trim=0.2,
+                 target=PERIOD_TARGET, min_periods=8, z=1.96):
+        if estimator not in ("median", "trimmed"):
+            raise ValueError(f"unknown estimator {estimator!r}, use 'median' or 'trimmed'")
+        self.signal_freq = float(signal_freq)
+        self.sample_rate = float(sample_rate)
+        self.period = self.sample_rate / self.signal_freq   # samples per period, not an integer
+        self.estimator = estimator
+        self.trim = trim
+        self.target = target
+        self.min_periods = max(min_periods, 2)
+        self.z = z
+        self.channels = channels
+        self.oscillator = np.exp(2j * np.pi / self.period * np.arange(int(np.ceil(self.period)) + 1))
+        self.phasors = []        # one (channels,) complex array per period, a few bytes per period
+        self.next = 0            # index of the next period
+        self.index = 0           # sample index behind the last chunk
+        self.carry = np.empty((channels, 0))
+
+    def boundary(self, k):
+        # first sample of period k
+        return int(round(k * self.period))
+
+    def update(self, chunk, start=None):
+        """
+            parameters: - chunk: new samples, (channels, m)
+                        - start: sample index of the chunk's first sample; None
+                          continues behind the previous chunk. A period with
+                          missing samples is dropped
+
+            return:     - True once the measurement has converged
+        """
+        y = np.asarray(chunk, dtype=float).reshape(self.channels, -1)
+        if start is None:
+            start = self.index
+        if start != self.index:
+            # gap: drop the open period, continue with the first one after it
+            self.carry = self.carry[:, :0]
+            while self.boundary(self.next) < start:
+                self.next += 1
+        self.index = start + y.shape[1]
+        # the carry holds the open period, from its first sample up to the chunk
+        offset = start - self.carry.shape[1]
+        y = np.concatenate((self.carry, y), axis=1) if self.carry.shape[1] else y
+        skip = self.boundary(self.next) - offset
+        if skip > 0:
+            y, offset = y[:, skip:], offset + skip
+
+        while self.boundary(self.next + 1) - offset <= y.shape[1]:
+            first, stop = self.boundary(self.next) - offset, self.boundary(self.next + 1) - offset
+            segment = y[:, first:stop]
+            # oscillator phase at the segment start, in cycles reduced to [0, 1)
+            rotation = np.exp(2j * np.pi * ((self.boundary(self.next) / self.period) % 1.0))
+            oscillator = rotation * self.oscillator[:stop - first]
+            # y = a*sin(wt) + b*cos(wt) + c by least squares: a rounded period is not
+            # a whole cycle, so plain mixing would leak; a*sin + b*cos -> phasor a + j b
+            basis = np.stack((oscillator.imag, oscillator.real, np.ones(stop - first)), axis=1)
+            a, b, _ = np.linalg.solve(basis.T @ basis, (segment @ basis).T)
+            self.phasors.append(a + 1j * b)
+            self.next += 1
+        self.carry = y[:, self.boundary(self.next) - offset:].copy()
+        return self.converged()
+
+    def combine(self, values):
+        """
+            robust centre and standard error of the rows of values (periods, k),
+            real and imaginary parts separately
+        """
+        n = values.shape[0]
+        centres, errors = [], []
+        for part in (values.real, values.imag):
+            if self.estimator == "median":
+                centre = np.median(part, axis=0)
+                # normal-consistent MAD; the median's standard error is sqrt(pi / 2) sigma / sqrt(n)
+                sigma = 1.4826 * np.median(np.abs(part - centre), axis=0)
+                error = np.sqrt(np.pi / 2) * sigma / np.sqrt(n)
+            else:
+                cut = int(self.trim * n)
+                ordered = np.sort(part, axis=0)
+                centre = ordered[cut:n - cut].mean(axis=0)
+                # Tukey-McLaughlin: winsorized standard deviation over the kept fraction
+                winsorized = np.clip(part, ordered[cut], ordered[n - cut - 1])
+                error = winsorized.std(axis=0, ddof=1) / ((1 - 2 * cut / n) * np.sqrt(n))
+            centres.append(centre)
+            errors.append(error)
+        return centres[0] + 1j * centres[1], np.hypot(*errors)
+
+    def interval(self):
+        """
+            return:     - ratios: (channels - 1,) robust ratio of every channel to channel 0
+                        - relative confidence interval half-widths of the ratios
+                          (inf until min_periods periods are in)
+        """
+        if len(self.phasors) < self.min_periods:
+            return np.full(self.channels - 1, np.nan + 0j), np.full(self.channels - 1, np.inf)
+        phasors = np.array(self.phasors)
+        ratios, errors = self.combine(phasors[:, 1:] / phasors[:, :1])
+        return ratios, self.z * errors / np.abs(ratios)
+
+    def converged(self):
+        return len(self.phasors) >= self.min_periods and bool(np.all(self.interval()[1] < self.target))
+
+    def result(self):
+        """
+            return:     - magnitude, phase (rad, relative to the sine reference) per
+                          channel, (channels,) arrays: channel 0 is its robust phasor,
+                          the others that times their robust ratio, so their ratios
+                          to channel 0 are the robust ratios; NaN for the others
+                          while fewer than min_periods periods are in
+        """
+        reference, _ = self.combine(np.array(self.phasors)[:, :1])
+        ratios, _ = self.interval()
+        phasors = reference[0] * np.concatenate(([1.0], ratios))
+        return np.abs(phasors), np.angle(phasors)
+
+def clean_buffer(y_buffer, signal_freq, sample_rate, cache=False):
+    # 1. Closed-form fit of y = a*sin(wt) + b*cos(wt) + c
+    # (3x3 normal equations; the sin/cos vectors are kept per (f, fs, N) only
+    # with cache=True, for frequencies that come back)
+    make_basis = sinefit.basis if cache else sinefit.basis.__wrapped__
+    sine_basis = make_basis(float(signal_freq), float(sample_rate), len(y_buffer))
+    a, b, c = sinefit.project(y_buffer, sine_basis)
+    sin_wt, cos_wt, _ = sine_basis
     
-    # 4. Reconstruct Clean Signal
-    y_clean = a * np.sin(omega * t) + b * np.cos(omega * t) + c
+    # 2. Reconstruct Clean Signal
+    y_clean = a * sin_wt + b * cos_wt + c
     
     # Optional: Calculate physical parameters relative to index 0
     amplitude = np.sqrt(a**2 + b**2)
@@ -242,25 +1010,13 @@ def clean_buffer(y_buffer, signal_freq, sample_rate):
     
     return y_clean, (amplitude, phase, c)
 
-def freq_selection_signal(y_buffer, freq_sweep, sample_rate):
-    mamp = 0
-    freq = []
-    c = 0
-    if freq_sweep[0]/0.9999 >= 0.1:
-        freq_int = 0.1 * freq_sweep[0]/0.9999
-    else:
-        freq_int = 1e-5 * freq_sweep[0]/0.9999
-
-    for f in np.arange(freq_sweep[0], freq_sweep[1], freq_int):
-        _, params = clean_buffer(y_buffer, f, sample_rate)
-        if params[0] > mamp:
-            mamp = params[0]
-            freq.append(f)
-        else:
-            c += 1
-            if c >= 3:
-                break
-    return freq[-1]
+def freq_selection_signal(y_buffer, freq_sweep, sample_rate, tolerance=None):
+    """
+    Frequency (Hz) inside freq_sweep at which the sine fit amplitude peaks.
+    DFT bracket + golden-section search (sinefit.estimate_frequency) instead of
+    a fixed-step scan; tolerance is the final bracket width in Hz.
+    """
+    return sinefit.estimate_frequency(y_buffer, freq_sweep, sample_rate, tolerance)
 
 def FFT(buffer, freq_sweep=[0, 100e3], sample_rate=100):
     """
@@ -300,96 +1056,419 @@ def FFT(buffer, freq_sweep=[0, 100e3], sample_rate=100):
 
     return freqs, mag, real_part, imag_part, freqs[np.argmax(mag)]
 
+def _fast_length(n):
+    """
+    smallest 2^a * 3^b * 5^c >= n, FFT lengths numpy transforms quickly
+    """
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            length = p35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+# chirp-Z kernels take about 32 bytes per sample (16 MB at 2^17 samples): a sweep's
+# decimated captures (up to ~50 periods of 1024 samples per point) fit the budget,
+# full-length buffers only keep the last few
+ZOOM_CACHE_BYTES = 64 * 2**20
+ZOOM_CACHE_ENTRIES = 32   # more than the points of a sweep
+
+@byte_cache(ZOOM_CACHE_BYTES, ZOOM_CACHE_ENTRIES)
+def _czt_kernels(N, start_freq, stop_freq, sample_rate, M):
+    """
+    Bluestein chirp-Z kernels for M points from start_freq to stop_freq:
+    Hann window folded into the input chirp, FFT of the convolution chirp and
+    the output chirp. Read-only, shared between calls with the same (N, band, M).
+    """
+    step = (stop_freq - start_freq) / (M - 1) if M > 1 else 0.0
+    L = _fast_length(N + M - 1)
+    n = np.arange(N, dtype=float)
+    k = np.arange(M, dtype=float)
+    # X[k] = sum x[n] exp(-j2pi n f_k / fs), with n*k = (n^2 + k^2 - (k - n)^2) / 2
+    half_step = np.pi * step / sample_rate
+    pre = np.hanning(N) * np.exp(-2j * np.pi * start_freq / sample_rate * n - 1j * half_step * n * n)
+    post = np.exp(-1j * half_step * k * k)
+    chirp = np.zeros(L, dtype=complex)
+    chirp[:M] = np.exp(1j * half_step * k * k)
+    chirp[L - N + 1:] = np.exp(1j * half_step * n[N - 1:0:-1] ** 2)
+    kernel = np.fft.fft(chirp)
+    for array in (pre, post, kernel):
+        array.flags.writeable = False
+    return pre, kernel, post, L
+
+def zoom_FFT(buffer, freq_sweep=[0, 100e3], sample_rate=100, points=256):
+    """
+    Hann-windowed spectrum evaluated only at `points` frequencies spanning
+    freq_sweep (chirp-Z transform), so the resolution is set by the band and
+    not by the bin spacing of the full FFT. Same scaling and returns as FFT;
+    when the FFT bins are already as fine as the zoom points, FFT itself, and
+    bands narrow enough for it are evaluated from sinefit.band_spectrum instead.
+    buffer : iterable of voltage samples (float)
+    freq_sweep : [start_freq, stop_freq] in Hz
+    points : number of frequencies evaluated in the band
+    Returns: (freqs, mag, real_part, imag_part, peak_freq)
+    """
+    x = np.asarray(buffer, dtype=float)
+    N = x.size
+    if N == 0:
+        return np.array([]), np.array([])
+
+    start_freq = float(freq_sweep[0])
+    stop_freq = float(freq_sweep[1])
+    band_bins = (stop_freq - start_freq) * N / sample_rate
+    if band_bins >= max(points - 1, 1):
+        # a wide band: the plain FFT resolves it at least as finely, for half the work
+        return FFT(x, freq_sweep, sample_rate)
+    freqs = np.linspace(start_freq, stop_freq, points)
+    # band_spectrum reduces the buffer to about pi * band_bins / BAND_BLOCK_PHASE blocks
+    if points * np.pi * band_bins / sinefit.BAND_BLOCK_PHASE <= N:
+        # evaluating every point costs less than a pass over the buffer: DFT of the
+        # windowed buffer from its block moments, no kernels
+        X = sinefit.band_spectrum(x * np.hanning(N), start_freq, stop_freq, float(sample_rate))(freqs)
+    else:
+        pre, kernel, post, L = _czt_kernels(N, start_freq, stop_freq, float(sample_rate), points)
+        X = np.fft.ifft(np.fft.fft(x * pre, L) * kernel)[:points] * post
+    mag = np.abs(X) / N
+
+    return freqs, mag, X.real, X.imag, freqs[np.argmax(mag)]
+
+# planned captures whose leakage bound is below this can skip the bandpass and
+# frequency re-estimate: demodulation at the nominal frequency is a single-bin DFT
+COHERENT_TOLERANCE = 1e-4
+
+def coherent_plan(signal_freq, clock, max_buffer, max_rate, min_cycles=2, source_error=0.0, search_cycles=16, search_dividers=4096):
+    """
+    Sample rate and buffer size that put an integer number of periods in the
+    capture. The ADC samples at clock / D for an integer divider D, so the
+    search runs over cycles M >= min_cycles and dividers D (rate <= max_rate)
+    for N = round(M * clock / (D * f)) <= max_buffer samples, minimising the
+    part of a period left over, |N * D * f / clock - M|.
+
+    Parameters
+    ----------
+    signal_freq    : perturbation frequency (Hz)
+    clock          : ADC base clock (Hz), the device's highest sample rate
+    max_buffer     : largest buffer size (samples)
+    max_rate       : highest sample rate wanted (Hz)
+    min_cycles     : fewest periods in the capture
+    source_error   : relative frequency error of the source against the ADC
+                     clock (e.g. 50e-6 for two crystals), added to the bound
+    search_cycles  : cycle counts tried, from min_cycles up
+    search_dividers: dividers tried per cycle count, from the fullest buffer down;
+                     the first one within COHERENT_TOLERANCE is taken
+
+    Returns
+    -------
+    sample_rate : clock / D (Hz), exactly realisable
+    buffer_size : N samples
+    ncycle      : M periods
+    leakage     : leftover / M + source_error, the relative leakage bound; below
+                  COHERENT_TOLERANCE demodulating at signal_freq (a single-bin
+                  DFT) is accurate to about that much, and the bandpass and
+                  frequency re-estimate can be skipped
+    """
+    f = float(signal_freq)
+    min_divider = max(1, int(np.ceil(clock / max_rate)))
+    best = None
+    for M in range(max(int(min_cycles), 1), max(int(min_cycles), 1) + search_cycles):
+        # N * D = P, with N <= max_buffer
+        P = M * clock / f
+        first = max(min_divider, int(np.ceil(P / max_buffer)))
+        D = first + np.arange(search_dividers, dtype=float)
+        N = np.round(P / D)
+        N = np.where(N > max_buffer, max_buffer, N)
+        leakage = np.abs(N * D * f / clock - M) / M + source_error
+        # the fullest buffer (smallest divider) within tolerance, else the least leakage
+        fits = np.flatnonzero(leakage < COHERENT_TOLERANCE)
+        i = int(fits[0]) if fits.size else int(np.argmin(leakage))
+        leakage = leakage[i]
+        if best is None or leakage < best[3]:
+            best = (clock / D[i], int(N[i]), M, leakage)
+        if leakage < COHERENT_TOLERANCE:
+            break
+    return best
+
+def multisine(frequencies, sample_rate, n_samples, iterations=100):
+    """
+    Crest-factor-optimized multisine: one period of a sum of equal-amplitude
+    tones, Schroeder phases refined by iterative peak clipping.
+
+    Parameters
+    ----------
+    frequencies : requested tone frequencies (Hz), e.g. np.logspace(1, -2, 16)
+    sample_rate : rate the period is played/sampled at (Hz)
+    n_samples   : samples in one period (e.g. the AWG custom buffer size)
+    iterations  : clipping iterations for the crest-factor optimization
+
+    Returns
+    -------
+    waveform    : one period, normalised to a peak of 1
+    tone_freqs  : the tones actually used (Hz); each is snapped to a harmonic
+                  of the period so that a capture of whole periods is leakage free
+    crest       : crest factor (peak / rms) of the waveform
+    """
+    f0 = sample_rate / n_samples
+    bins = np.unique(np.clip(np.round(np.asarray(frequencies, dtype=float) / f0).astype(int), 1, n_samples // 2 - 1))
+    k = np.arange(1, len(bins) + 1)
+    phases = -np.pi * k * (k - 1) / len(bins)   # Schroeder phases
+
+    spectrum = np.zeros(n_samples // 2 + 1, dtype=complex)
+    best, best_crest = None, np.inf
+    for _ in range(max(iterations, 1)):
+        spectrum[bins] = np.exp(1j * phases)
+        x = np.fft.irfft(spectrum, n_samples)
+        peak = np.max(np.abs(x))
+        crest = peak / np.sqrt(np.mean(x ** 2))
+        if crest < best_crest:
+            best, best_crest = x / peak, crest
+        # clip the peaks, keep the phases of the clipped signal, restore flat amplitudes
+        limit = 1.5 * peak / crest
+        phases = np.angle(np.fft.rfft(np.clip(x, -limit, limit))[bins])
+
+    return best, bins * f0, best_crest
+
+def multisine_impedance(current, voltages, tone_freqs, sample_rate, guard=2, noise_bins=20):
+    """
+    Impedance of every multisine tone from one capture, using the FFT helper.
+    The capture should hold a whole number of at least two multisine periods:
+    the tones then sit at least two bins apart, on the zeros of the Hann
+    window, while with one period adjacent tones leak into each other's bins.
+
+    Parameters
+    ----------
+    current    : current samples (A), 1-D
+    voltages   : voltage samples (V), (K, n) array or list of K 1-D arrays
+    tone_freqs : excited frequencies (Hz), as returned by multisine()
+    sample_rate: sampling rate (Hz)
+    guard      : bins on each side of a tone excluded from the noise estimate
+                 (Hann window leakage)
+    noise_bins : half-width (bins) of the neighbourhood the noise floor is taken from
+
+    Returns
+    -------
+    Z      : (K, n_tones) complex impedances V / I
+    snr_db : (K, n_tones) per-tone SNR (dB), the lower of the current and the
+             voltage channel; low values mark tones to re-measure on their own
+    """
+    n = len(current)
+    df = sample_rate / n
+    tone_bins = np.round(np.asarray(tone_freqs, dtype=float) / df).astype(int)
+
+    # bins free of excitation, used for the noise floor
+    excited = np.zeros(n // 2 + 1, dtype=bool)
+    for offset in range(-guard, guard + 1):
+        excited[np.clip(tone_bins + offset, 0, n // 2)] = True
+    excited[0] = True   # DC
+
+    def phasors(y):
+        _, mag, real_part, imag_part, _ = FFT(y, freq_sweep=[0, sample_rate / 2], sample_rate=sample_rate)
+        power = mag ** 2
+        noise = np.empty(len(tone_bins))
+        for index, b in enumerate(tone_bins):
+            window = slice(max(b - noise_bins, 0), b + noise_bins + 1)
+            quiet = power[window][~excited[window]]
+            noise[index] = np.median(quiet if quiet.size else power[~excited])
+        snr = 10 * np.log10(power[tone_bins] / np.maximum(noise, np.finfo(float).tiny))
+        return real_part[tone_bins] + 1j * imag_part[tone_bins], snr
+
+    I, snr_i = phasors(current)
+    Z = []
+    snr_db = []
+    for v in voltages:
+        V, snr_v = phasors(v)
+        Z.append(V / I)
+        snr_db.append(np.minimum(snr_i, snr_v))
+    return np.array(Z), np.array(snr_db)
+
+# probed device capabilities, reused on later starts
+CAPABILITY_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "mydigilent", "capabilities.json")
+
+class capability_cache:
+    """
+        on-disk cache of probed device capabilities, one entry per device id and
+        revision; an entry is dropped when the WaveForms (firmware) version changes
+
+        every instance owns one entry; a save merges it into the file as it is on
+        disk, so the devices of a device_pool keep each other's entries
+    """
+    # serialises the read-merge-write of all instances in this process
+    lock = Lock()
+
+    def __init__(self, key, version, path=CAPABILITY_CACHE):
+        self.key = key
+        self.path = path
+        self.entries = self.load(path)
+        entry = self.entries.get(key)
+        if entry is None or entry.get("version") != version:
+            self.entries[key] = {"version": version, "sections": {}}
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, section):
+        return self.entries[self.key]["sections"].get(section)
+
+    def set(self, section, values):
+        self.entries[self.key]["sections"][section] = values
+        with capability_cache.lock:
+            entries = self.load(self.path)
+            entries[self.key] = self.entries[self.key]
+            _atomic_write(self.path, lambda file: json.dump(entries, file), mode="w")
+
+class capabilities:
+    """
+        one group of device capabilities (e.g. analog.input), read from the
+        capability cache or probed from the device on first attribute access
+    """
+    def __init__(self, name, probe, cache):
+        self._name = name
+        self._probe = probe
+        self._cache = cache
+        self._probed = False
+
+    def __getattr__(self, attribute):
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        values = self._cache.get(self._name)
+        # sections cached by an older probe may lack newer attributes, probe once more
+        if values is None or (attribute not in values and not self._probed):
+            values = self._probe()
+            self._probed = True
+            self._cache.set(self._name, values)
+        # later lookups hit the instance dictionary directly
+        self.__dict__.update(values)
+        if attribute not in values:
+            raise AttributeError(attribute)
+        return values[attribute]
+
 class data:
-    """ stores the device handle, the device name and the device data """
-    handle = ctypes.c_int(0)
-    name = ""
-    version = ""
-    class analog:
-        class input:
-            channel_count = 0
-            max_buffer_size = 0
-            max_resolution = 0
-            min_range = 0
-            max_range = 0
-            steps_range = 0
-            min_offset = 0
-            max_offset = 0
-            steps_offset = 0
-        class output:
-            channel_count = 0
-            node_count = []
-            node_type = []
-            max_buffer_size = []
-            min_amplitude = []
-            max_amplitude = []
-            min_offset = []
-            max_offset = []
-            min_frequency = []
-            max_frequency = []
-        class IO:
-            channel_count = 0
-            node_count = []
-            channel_name = []
-            channel_label = []
-            node_name = []
-            node_unit = []
-            min_set_range = []
-            max_set_range = []
-            min_read_range = []
-            max_read_range = []
-            set_steps = []
-            read_steps = []
-    class digital:
-        class input:
-            channel_count = 0
-            max_buffer_size = 0
-        class output:
-            channel_count = 0
-            max_buffer_size = 0
-
-class error(Exception):
-    """
-        WaveForms SDK error
-    """
-    def __init__(self, message, function, instrument):
-        self.message = message
-        self.function = function
-        self.instrument = instrument
-        return
-    def __str__(self):
-        return "Error: " + self.instrument + " -> " + self.function + " -> " + self.message
+    """
+        stores the device handle, the device name and the device data
 
-class warning(Exception):
+        one instance per opened device; analog.input/output/IO and
+        digital.input/output are capabilities groups set by __get_info__
     """
-        WaveForms SDK warning, or non-fatal error
+    class group:
+        """ attribute namespace for capability groups """
+
+    def __init__(self):
+        self.handle = ctypes.c_int(0)
+        self.name = ""
+        self.version = ""
+        self.serial = ""
+        self.analog = data.group()
+        self.digital = data.group()
+
+# UART command frames
+UART_FRAME_SIZE = 8
+UART_FRAME_CACHE_SIZE = 256
+UART_FREQUENCY_TAG = 0x01   # first byte of a binary frequency frame, never sent in text commands
+
+def encode_command(command):
     """
-    def __init__(self, message, function, instrument):
-        self.message = message
-        self.function = function
-        self.instrument = instrument
-        return
-    def __str__(self):
-        return "Warning: " + self.instrument + " -> " + self.function + " -> " + self.message
+        encodes a text command into a fixed-size UART frame (truncated or zero padded)
+    """
+    return command.encode("UTF-8")[:UART_FRAME_SIZE].ljust(UART_FRAME_SIZE, b"\0")
+
+def encode_frequency(frequency):
+    """
+        encodes a frequency into a binary UART frame: the UART_FREQUENCY_TAG byte,
+        the frequency as a little-endian float32 and zero padding; the MCU firmware
+        must decode this form instead of parsing the text command
+    """
+    return struct.pack("<Bf", UART_FREQUENCY_TAG, frequency).ljust(UART_FRAME_SIZE, b"\0")
+
+# sweep plan upload: one message per sweep, then one short event per point
+SWEEP_PLAN_HEADER = b"PLAN"
+SWEEP_EVENT = "P"           # the MCU sends "P<point index>\n" once a point is settled
+
+def encode_sweep_plan(frequencies, cycles, settle_times):
+    """
+        encodes a whole sweep into one UART message: SWEEP_PLAN_HEADER, the point
+        count (uint16), one record per point (frequency float32, cycle count uint16,
+        settle time in seconds float32), all little-endian, and a one-byte checksum
+        (sum of the bytes after the header, modulo 256)
+    """
+    if not len(frequencies) == len(cycles) == len(settle_times):
+        raise error("frequencies, cycles and settle_times differ in length", "encode_sweep_plan", "protocol/uart")
+    body = struct.pack("<H", len(frequencies)) + b"".join(
+        struct.pack("<fHf", frequency, int(cycle_count), settle_time)
+        for frequency, cycle_count, settle_time in zip(frequencies, cycles, settle_times))
+    return SWEEP_PLAN_HEADER + body + bytes([sum(body) & 0xFF])
+
+SWEEP_NEXT_HEADER = b"NEXT"
+
+def encode_sweep_next(point):
+    """
+        encodes the early end of a point in one UART message: SWEEP_NEXT_HEADER,
+        the index of the point (uint16, little-endian) and a one-byte checksum as
+        in encode_sweep_plan. The MCU stops perturbing that point and moves on:
+        to the next point of an uploaded plan, or to "DoneRecv" in handshake mode
+    """
+    body = struct.pack("<H", point)
+    return SWEEP_NEXT_HEADER + body + bytes([sum(body) & 0xFF])
+
+MULTISINE_HEADER = b"MSIN"
+
+def encode_multisine(frequencies, phases):
+    """
+        encodes a multisine for the MCU in one UART message: MULTISINE_HEADER,
+        the tone count (uint16), one record per tone (frequency float32, phase in
+        radians float32), all little-endian, and a one-byte checksum as in
+        encode_sweep_plan
+    """
+    if len(frequencies) != len(phases):
+        raise error("frequencies and phases differ in length", "encode_multisine", "protocol/uart")
+    body = struct.pack("<H", len(frequencies)) + b"".join(
+        struct.pack("<ff", frequency, phase) for frequency, phase in zip(frequencies, phases))
+    return MULTISINE_HEADER + body + bytes([sum(body) & 0xFF])
+
+# device configuration policies: the enumeration info each one maximizes
+CONFIG_POLICIES = {
+    "max scope buffer": constants.DECIAnalogInBufferSize,
+    "max generator buffer": constants.DECIAnalogOutBufferSize,
+    "max logic buffer": constants.DECIDigitalInBufferSize,
+}
 
 class MyDigilent:
-    def __init__(self, rx, tx, baud_rate=115200, parity=None, data_bits=8, stop_bits=1):
+    def __init__(self, rx, tx, baud_rate=115200, parity=None, data_bits=8, stop_bits=1, config=0, scope_channels=1, serial=None):
+        """
+            opens a device and initializes UART communication
+
+            serial: serial number of the device to open (as listed by
+                    enum_serials()); if None, the first available device is opened
+
+            config: device configuration index, or a policy from CONFIG_POLICIES
+                    (e.g. "max scope buffer") to pick the configuration that has
+                    the deepest buffer while offering at least scope_channels
+                    analog-in channels
+        """
         self.device = None
-        self.config = 0
+        self.config = config
+
+        # load the dynamic library with typed, error-checked functions
+        self.dwf = dwfbindings.load()
 
-        # load the dynamic library, get constants path (the path is OS specific)
+        # get constants path (the path is OS specific)
         if platform.startswith("win"):
             # on Windows
-            self.dwf = ctypes.cdll.dwf
             constants_path = "C:" + sep + "Program Files (x86)" + sep + "Digilent" + sep + "WaveFormsSDK" + sep + "samples" + sep + "py"
         elif platform.startswith("darwin"):
             # on macOS
-            lib_path = sep + "Library" + sep + "Frameworks" + sep + "dwf.framework" + sep + "dwf"
-            self.dwf = ctypes.cdll.LoadLibrary(lib_path)
             constants_path = sep + "Applications" + sep + "WaveForms.app" + sep + "Contents" + sep + "Resources" + sep + "SDK" + sep + "samples" + sep + "py"
         else:
             # on Linux
-            self.dwf = ctypes.cdll.LoadLibrary("libdwf.so")
             constants_path = sep + "usr" + sep + "share" + sep + "digilent" + sep + "waveforms" + sep + "samples" + sep + "py"
 
         # import constants
@@ -412,7 +1491,7 @@ class MyDigilent:
 
         # check for connected devices
         if device_count.value <= 0:
-            if device_type.value == 0:
+            if device_type == 0:
                 raise error("There are no connected devices", "open", "device")
             else:
                 raise error("Error: There is no " + str(self.device) + " connected", "open", "device")
@@ -420,10 +1499,19 @@ class MyDigilent:
         # this is the device handle - it will be used by all functions to "address" the connected device
         device_handle = ctypes.c_int(0)
 
-        # connect to the first available device
+        # connect to the first available device, or to the one with the requested serial number
         index = 0
+        open_error = None
         while device_handle.value == 0 and index < device_count.value:
-            self.dwf.FDwfDeviceConfigOpen(ctypes.c_int(index), ctypes.c_int(self.config), ctypes.byref(device_handle))
+            if serial is not None and self.__enum_serial__(index) != str(serial).replace("SN:", ""):
+                index += 1
+                continue
+            try:
+                if isinstance(config, str):
+                    self.config, self.config_info = self.select_config(index, config, scope_channels)
+                self.dwf.FDwfDeviceConfigOpen(index, self.config, ctypes.byref(device_handle))
+            except error as err:
+                open_error = err
             index += 1  # increment the index and try again if the device is busy
 
         # check connected device type
@@ -431,28 +1519,28 @@ class MyDigilent:
         if device_handle.value != 0:
             device_id = ctypes.c_int()
             device_rev = ctypes.c_int()
-            self.dwf.FDwfEnumDeviceType(ctypes.c_int(index - 1), ctypes.byref(device_id), ctypes.byref(device_rev))
+            self.dwf.FDwfEnumDeviceType(index - 1, ctypes.byref(device_id), ctypes.byref(device_rev))
 
             # decode device id
             for pair in device_names:
-                if pair[1].value == device_id.value:
+                if pair[1] == device_id.value:
                     device_name = pair[0]
                     break
 
         # check for errors
         # if the device handle is empty after a connection attempt
-        if device_handle == constants.hdwfNone:
-            # check for errors
-            err_nr = ctypes.c_int() # variable for error number
-            self.dwf.FDwfGetLastError(ctypes.byref(err_nr));  # get error number
-            # if there is an error
-            if err_nr != constants.dwfercNoErc:
-                # check the error message
-                self.check_error()
-        global data
-        data.handle = device_handle
-        data.name = device_name
-        self.dev = self.__get_info__(data)
+        if device_handle.value == constants.hdwfNone:
+            if open_error is not None:
+                raise open_error
+            if serial is not None:
+                raise error("There is no device with serial number " + str(serial) + " connected", "open", "device")
+            raise error("Failed to open the device", "open", "device")
+        # device state belongs to this instance, several devices can be open at once
+        device_data = data()
+        device_data.handle = device_handle
+        device_data.name = device_name
+        device_data.serial = self.__enum_serial__(index - 1)
+        self.dev = self.__get_info__(device_data, device_id.value, device_rev.value, self.config)
 
         """
         initializes UART communication
@@ -466,18 +1554,14 @@ class MyDigilent:
                     - stop_bits (default is 1)
         """
         # set baud rate
-        if self.dwf.FDwfDigitalUartRateSet(self.dev.handle, ctypes.c_double(baud_rate)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartRateSet(self.dev.handle, baud_rate)
 
         # set communication channels
-        if self.dwf.FDwfDigitalUartTxSet(self.dev.handle, ctypes.c_int(tx)) == 0:
-            self.check_error()
-        if self.dwf.FDwfDigitalUartRxSet(self.dev.handle, ctypes.c_int(rx)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartTxSet(self.dev.handle, tx)
+        self.dwf.FDwfDigitalUartRxSet(self.dev.handle, rx)
 
         # set data bit count
-        if self.dwf.FDwfDigitalUartBitsSet(self.dev.handle, ctypes.c_int(data_bits)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartBitsSet(self.dev.handle, data_bits)
 
         # set parity bit requirements
         if parity == True:
@@ -486,78 +1570,179 @@ class MyDigilent:
             parity = 1
         else:
             parity = 0
-        if self.dwf.FDwfDigitalUartParitySet(self.dev.handle, ctypes.c_int(parity)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartParitySet(self.dev.handle, parity)
 
         # set stop bit count
-        if self.dwf.FDwfDigitalUartStopSet(self.dev.handle, ctypes.c_double(stop_bits)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartStopSet(self.dev.handle, stop_bits)
 
         # initialize channels with idle levels
 
         # dummy read
-        dummy_buffer = ctypes.create_string_buffer(0)
-        dummy_buffer = ctypes.c_int(0)
+        dummy_count = ctypes.c_int(0)
         dummy_parity_flag = ctypes.c_int(0)
-        if self.dwf.FDwfDigitalUartRx(self.dev.handle, dummy_buffer, ctypes.c_int(0), ctypes.byref(dummy_buffer), ctypes.byref(dummy_parity_flag)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartRx(self.dev.handle, None, 0, ctypes.byref(dummy_count), ctypes.byref(dummy_parity_flag))
 
         # dummy write
-        if self.dwf.FDwfDigitalUartTx(self.dev.handle, dummy_buffer, ctypes.c_int(0)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartTx(self.dev.handle, None, 0)
 
-    def uart_read(self):
+    def __enum_serial__(self, device_index):
         """
-            receives data from UART
-            
-            parameters: - device data
+            serial number of an enumerated device, without the "SN:" prefix
+        """
+        serial = ctypes.create_string_buffer(32)
+        self.dwf.FDwfEnumSN(device_index, serial)
+        return serial.value.decode("ascii").replace("SN:", "")
 
-            return:     - integer list containing the received bytes
+    @staticmethod
+    def enum_serials():
+        """
+            lists the serial numbers of all connected devices
+        """
+        dwf = dwfbindings.load()
+        device_count = ctypes.c_int()
+        dwf.FDwfEnum(constants.enumfilterAll, ctypes.byref(device_count))
+        serials = []
+        for index in range(device_count.value):
+            serial = ctypes.create_string_buffer(32)
+            dwf.FDwfEnumSN(index, serial)
+            serials.append(serial.value.decode("ascii").replace("SN:", ""))
+        return serials
+
+    def enum_configs(self, device_index):
         """
-        # variable to store results
-        rx_data = []
+            lists the configurations of an enumerated device
 
-        # create empty string buffer
-        data = (ctypes.c_ubyte * 8193)()
+            return:     - list of dictionaries with the channel counts and buffer
+                          sizes (per channel) of each configuration
+        """
+        fields = {"analog_in_channels": constants.DECIAnalogInChannelCount,
+                  "analog_out_channels": constants.DECIAnalogOutChannelCount,
+                  "analog_io_channels": constants.DECIAnalogIOChannelCount,
+                  "digital_in_channels": constants.DECIDigitalInChannelCount,
+                  "digital_out_channels": constants.DECIDigitalOutChannelCount,
+                  "digital_io_channels": constants.DECIDigitalIOChannelCount,
+                  "analog_in_buffer_size": constants.DECIAnalogInBufferSize,
+                  "analog_out_buffer_size": constants.DECIAnalogOutBufferSize,
+                  "digital_in_buffer_size": constants.DECIDigitalInBufferSize,
+                  "digital_out_buffer_size": constants.DECIDigitalOutBufferSize}
+        config_count = ctypes.c_int()
+        self.dwf.FDwfEnumConfig(device_index, ctypes.byref(config_count))
+        value = ctypes.c_int()
+        configs = []
+        for config_index in range(config_count.value):
+            info = {}
+            for name, field in fields.items():
+                self.dwf.FDwfEnumConfigInfo(config_index, field, ctypes.byref(value))
+                info[name] = value.value
+            configs.append(info)
+        return configs
+
+    def select_config(self, device_index, policy="max scope buffer", scope_channels=1):
+        """
+            picks the configuration of an enumerated device according to a policy
 
-        # character counter
-        count = ctypes.c_int(0)
+            parameters: - device_index: index of the device in the enumeration
+                        - policy: a key of CONFIG_POLICIES
+                        - scope_channels: analog-in channels the configuration must offer
 
-        # parity flag
-        parity_flag= ctypes.c_int(0)
+            return:     - (configuration index, configuration info)
+        """
+        if policy not in CONFIG_POLICIES:
+            raise error("Unknown configuration policy: " + str(policy), "select_config", "device")
+        field = {constants.DECIAnalogInBufferSize: "analog_in_buffer_size",
+                 constants.DECIAnalogOutBufferSize: "analog_out_buffer_size",
+                 constants.DECIDigitalInBufferSize: "digital_in_buffer_size"}[CONFIG_POLICIES[policy]]
+        configs = self.enum_configs(device_index)
+        candidates = [index for index, info in enumerate(configs) if info["analog_in_channels"] >= scope_channels]
+        if not candidates:
+            raise error("No configuration offers " + str(scope_channels) + " analog-in channels", "select_config", "device")
+        best = max(candidates, key=lambda index: configs[index][field])
+        return best, configs[best]
+
+    def uart_receive(self):
+        """
+            moves everything the UART received since the last call into
+            self.uart_rx_buffer, using one reusable receive buffer
 
-        # read up to 8k characters
-        if self.dwf.FDwfDigitalUartRx(self.dev.handle, data, ctypes.c_int(ctypes.sizeof(data)-1), ctypes.byref(count), ctypes.byref(parity_flag)) == 0:
-            self.check_error()
+            return:     - number of bytes received
+        """
+        if getattr(self, "_uart_rx", None) is None:
+            # allocated once, reused by every read
+            self._uart_rx = (ctypes.c_ubyte * 8193)()
+            self._uart_count = ctypes.c_int(0)
+            self._uart_parity = ctypes.c_int(0)
+            self._uart_refs = (ctypes.byref(self._uart_count), ctypes.byref(self._uart_parity))
+            self.uart_rx_buffer = bytearray()
+        rx = self.dwf.FDwfDigitalUartRx
+        total = 0
+        # read up to 8k characters at a time until the receiver is empty
+        while True:
+            rx(self.dev.handle, self._uart_rx, ctypes.sizeof(self._uart_rx)-1, *self._uart_refs)
+            count = self._uart_count.value
+            if count <= 0:
+                break
+            self.uart_rx_buffer += ctypes.string_at(self._uart_rx, count)
+            total += count
 
-        # append current data chunks
-        for index in range(0, count.value):
-            rx_data.append(int(data[index]))
+            # check for not acknowledged
+            if self._uart_parity.value < 0:
+                raise warning("Buffer overflow", "read", "protocol/uart")
+            elif self._uart_parity.value > 0:
+                raise warning("Parity error: index {}".format(self._uart_parity.value), "read", "protocol/uart")
+        return total
 
-        # ensure data integrity
-        while count.value > 0:
-            # create empty string buffer
-            data = (ctypes.c_ubyte * 8193)()
+    def uart_read(self):
+        """
+            receives data from UART
+            
+            parameters: - device data
 
-            # character counter
-            count = ctypes.c_int(0)
+            return:     - integer list containing the received bytes
+        """
+        self.uart_receive()
+        rx_data = list(self.uart_rx_buffer)
+        self.uart_rx_buffer.clear()
+        return rx_data
 
-            # parity flag
-            parity_flag= ctypes.c_int(0)
+    def uart_read_until(self, terminator, timeout=None, min_interval=0.001, max_interval=0.05):
+        """
+            blocks until a terminator (delimiter or whole message) has been received
 
-            # read up to 8k characters
-            if self.dwf.FDwfDigitalUartRx(self.dev.handle, data, ctypes.c_int(ctypes.sizeof(data)-1), ctypes.byref(count), ctypes.byref(parity_flag)) == 0:
-                self.check_error()
-            # append current data chunks
-            for index in range(0, count.value):
-                rx_data.append(int(data[index]))
+            parameters: - terminator: bytes/str, or a tuple/list of them to wait for
+                          any of several messages
+                        - timeout in seconds, None waits forever
+                        - min_interval, max_interval: bounds of the polling interval (s),
+                          the interval doubles while nothing arrives
 
-            # check for not acknowledged
-            if parity_flag.value < 0:
-                raise warning("Buffer overflow", "read", "protocol/uart")
-            elif parity_flag.value > 0:
-                raise warning("Parity error: index {}".format(parity_flag.value), "read", "protocol/uart")
-        return rx_data
+            return:     - the received bytes up to and including the first terminator,
+                          or None on timeout; later bytes stay buffered for the next read
+        """
+        if isinstance(terminator, (str, bytes)):
+            terminator = (terminator,)
+        terminators = [t.encode("UTF-8") if isinstance(t, str) else bytes(t) for t in terminator]
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        interval = min_interval
+        searched = 0
+        self.uart_receive()
+        while True:
+            # earliest match; only new bytes (plus a terminator-long overlap) are searched
+            start = max(0, searched - max(len(t) for t in terminators) + 1)
+            matches = [(self.uart_rx_buffer.find(t, start), len(t)) for t in terminators]
+            matches = [(position, length) for position, length in matches if position >= 0]
+            if matches:
+                position, length = min(matches)
+                message = bytes(self.uart_rx_buffer[:position + length])
+                del self.uart_rx_buffer[:position + length]
+                return message
+            searched = len(self.uart_rx_buffer)
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            time.sleep(interval if deadline is None else max(0, min(interval, deadline - time.perf_counter())))
+            if self.uart_receive() > 0:
+                interval = min_interval
+            else:
+                interval = min(interval * 2, max_interval)
 
     def uart_write(self, data):
         """
@@ -575,19 +1760,63 @@ class MyDigilent:
         data = ctypes.create_string_buffer(data.encode("UTF-8"))
 
         # send text, trim zero ending
-        if self.dwf.FDwfDigitalUartTx(self.dev.handle, data, ctypes.c_int(ctypes.sizeof(data)-1)) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartTx(self.dev.handle, data, ctypes.sizeof(data)-1)
+
+        return
+
+    def uart_write_frame(self, frame):
+        """
+            sends a pre-encoded frame in a single UART transfer
 
+            parameters: - frame: bytes; the ctypes buffer of each distinct frame
+                          is cached, so repeated commands are not re-encoded
+        """
+        if getattr(self, "_uart_frames", None) is None:
+            self._uart_frames = {}
+        cache = self._uart_frames
+        buffer = cache.get(frame)
+        if buffer is None:
+            if len(cache) >= UART_FRAME_CACHE_SIZE:
+                cache.clear()
+            buffer = cache[frame] = ctypes.create_string_buffer(frame, len(frame))
+        self.dwf.FDwfDigitalUartTx(self.dev.handle, buffer, len(frame))
         return
 
     def sendStringUART(self, section):
-        i = 0
-        while i < 8:
-            if i < len(section):
-                self.uart_write(section[i])
-            else:
-                self.uart_write("\0")
-            i += 1
+        # the command frame is the first 8 characters, zero padded, sent at once
+        self.uart_write_frame(encode_command(section))
+
+    def sendFrequencyUART(self, frequency):
+        # compact binary form of a frequency command, see encode_frequency
+        self.uart_write_frame(encode_frequency(frequency))
+
+    def send_sweep_plan(self, frequencies, cycles, settle_times):
+        """
+            uploads the complete sweep plan to the MCU in one transfer (see encode_sweep_plan)
+        """
+        self.uart_write_frame(encode_sweep_plan(frequencies, cycles, settle_times))
+
+    def send_sweep_next(self, point):
+        """
+            tells the MCU that a point has converged, ending its perturbation early
+            (see encode_sweep_next)
+        """
+        self.uart_write_frame(encode_sweep_next(point))
+
+    def wait_sweep_event(self, timeout=None):
+        """
+            waits for the MCU event that marks the next point of an uploaded sweep plan
+
+            return:     - index of the point, or None on timeout
+        """
+        message = self.uart_read_until(b"\n", timeout)
+        if message is None:
+            return None
+        text = message.decode("UTF-8", errors="ignore").strip()
+        position = text.rfind(SWEEP_EVENT)
+        if position < 0 or not text[position + 1:].isdigit():
+            raise warning("Unexpected sweep event: " + text, "read", "protocol/uart")
+        return int(text[position + 1:])
 
     def scope_setup(self, channels=[1, 2]):
         self.channels = channels
@@ -596,34 +1825,80 @@ class MyDigilent:
         # Enable all 4 channels (Indices 0, 1, 2, 3)
         for i in self.channels:
             # Enable channel
-            self.dwf.FDwfAnalogInChannelEnableSet(self.dev.handle, ctypes.c_int(i-1), ctypes.c_bool(True))
+            self.dwf.FDwfAnalogInChannelEnableSet(self.dev.handle, i-1, True)
             # Set Range (e.g., 5V peak-to-peak)
-            self.dwf.FDwfAnalogInChannelRangeSet(self.dev.handle, ctypes.c_int(i-1), ctypes.c_double(5.0))
+            self.dwf.FDwfAnalogInChannelRangeSet(self.dev.handle, i-1, 5.0)
             # Set Offset (0V)
-            self.dwf.FDwfAnalogInChannelOffsetSet(self.dev.handle, ctypes.c_int(i-1), ctypes.c_double(0.0))
+            self.dwf.FDwfAnalogInChannelOffsetSet(self.dev.handle, i-1, 0.0)
+
+    def capture_buffer(self, buffer_size):
+        """
+            returns the reusable (channels, buffer_size) capture array, allocated
+            only when the channel count or the buffer size changes
+        """
+        shape = (len(self.channels), buffer_size)
+        if getattr(self, "_capture_buffer", None) is None or self._capture_buffer.shape != shape:
+            self._capture_buffer = np.empty(shape)
+            # ctypes pointers into each row, created once per allocation
+            self._capture_rows = [row.ctypes.data_as(ctypes.POINTER(ctypes.c_double)) for row in self._capture_buffer]
+        return self._capture_buffer
+
+    def scope_record(self, sample_rate=1e3, buffer_size=300, reuse_buffer=False, overlapped=False, on_chunk=None, chunk_size=None):
+        """
+            single-shot capture of all enabled channels
+
+            parameters: - sample_rate (Hz)
+                        - buffer_size: samples per channel
+                        - reuse_buffer: if True, the samples are fetched straight into the
+                          reusable (channels, buffer_size) array from capture_buffer() and
+                          that array is returned; it is overwritten by the next capture
+                        - overlapped: if True, the samples are transferred in chunks while
+                          the capture is still running (see scope_stream)
+                        - on_chunk: callback(record, start, stop) run on every chunk in
+                          overlapped mode, e.g. to preprocess the new samples; a true
+                          return value ends the capture early
+                        - chunk_size: samples per transfer in overlapped mode
+
+            return:     - list of one array per channel, or the 2-D capture array
+        """
+        # Captures longer than the on-board memory are streamed in record mode
+        if overlapped or buffer_size > self.dev.analog.input.max_buffer_size:
+            return self.scope_stream(sample_rate, buffer_size, out=self.capture_buffer(buffer_size) if reuse_buffer else None,
+                                     on_chunk=on_chunk, chunk_size=chunk_size)
 
-    def scope_record(self, sample_rate=1e3, buffer_size=300):
         # Set Master Acquisition Parameters
-        self.dwf.FDwfAnalogInFrequencySet(self.dev.handle, ctypes.c_double(sample_rate))
-        self.dwf.FDwfAnalogInBufferSizeSet(self.dev.handle, ctypes.c_int(buffer_size))
+        self.dwf.FDwfAnalogInFrequencySet(self.dev.handle, sample_rate)
+        self.dwf.FDwfAnalogInBufferSizeSet(self.dev.handle, buffer_size)
 
         # 4. Start the Acquisition
         # This single command starts the capture for ALL enabled channels simultaneously.
         # Reconfigure = False, Start = True
         print("Starting acquisition...")
-        self.dwf.FDwfAnalogInConfigure(self.dev.handle, ctypes.c_bool(False), ctypes.c_bool(True))
+        self.dwf.FDwfAnalogInConfigure(self.dev.handle, False, True)
 
         # 5. Wait for acquisition to finish
-        status = ctypes.c_byte()
+        # sleep until the predicted end of the capture, then poll closely
+        t_end = time.perf_counter() + buffer_size / sample_rate
+        status = ctypes.c_ubyte()
+        status_ref = ctypes.byref(status)
+        analog_in_status = self.dwf.FDwfAnalogInStatus
         while True:
-            self.dwf.FDwfAnalogInStatus(self.dev.handle, ctypes.c_bool(True), ctypes.byref(status))
-            if status.value == constants.DwfStateDone.value:
+            analog_in_status(self.dev.handle, True, status_ref)
+            if status.value == constants.DwfStateDone:
                 break
-            time.sleep(0.01)
-        
+            remaining = t_end - time.perf_counter()
+            time.sleep(remaining if remaining > 0.001 else 0.001)
+
         print("Acquisition done. Fetching data...")
 
         # 6. Retrieve Data
+        if reuse_buffer:
+            # no intermediate buffer, every channel lands in its row of one contiguous array
+            record = self.capture_buffer(buffer_size)
+            for row, i in enumerate(self.channels):
+                self.dwf.FDwfAnalogInStatusData(self.dev.handle, i-1, self._capture_rows[row], buffer_size)
+            return record
+
         # We create a dictionary or list to store arrays for each channel
         data_sets = []
 
@@ -632,231 +1907,422 @@ class MyDigilent:
 
         for i in self.channels:
             # Fetch data for channel 'i' from the device to our local 'c_buffer'
-            self.dwf.FDwfAnalogInStatusData(self.dev.handle, ctypes.c_int(i-1), c_buffer, ctypes.c_int(buffer_size))
+            self.dwf.FDwfAnalogInStatusData(self.dev.handle, i-1, c_buffer, buffer_size)
             # Convert to standard Python list/numpy array and store
             data_sets.append(np.array(c_buffer))
-        
+
         return data_sets
 
-    def check_error(self):
-        """
-            check for errors
-        """
-        err_msg = ctypes.create_string_buffer(512)        # variable for the error message
-        self.dwf.FDwfGetLastErrorMsg(err_msg)                  # get the error message
-        err_msg = err_msg.value.decode("ascii")           # format the message
-        if err_msg != "":
-            err_func = inspect.stack()[1].function        # get caller function
-            err_inst = inspect.stack()[1].filename        # get caller file name
-            # delete the extension
-            err_inst = err_inst.split('.')[0]
-            # delete the path
-            path_list = err_inst.split('/')
-            err_inst = path_list[-1]
-            path_list = err_inst.split('\\')
-            err_inst = path_list[-1]
-            raise error(err_msg, err_func, err_inst)
-        return
+    def scope_stream(self, sample_rate, n_samples, filename=None, poll_interval=0.001, out=None, on_chunk=None, chunk_size=None):
+        """
+            records n_samples per enabled channel in record mode, pulling chunks
+            from the instrument while it captures (not limited by the device buffer)
+
+            parameters: - sample_rate (Hz)
+                        - n_samples per channel
+                        - filename: if given, the samples are written into a
+                          memory-mapped .npy file instead of RAM
+                        - poll_interval: shortest sleep (s) between two status polls
+                        - out: preallocated (channels, n_samples) array to fill
+                        - on_chunk: callback(record, start, stop) run after every transfer,
+                          so the new samples can be processed while the capture continues;
+                          a true return value ends the record early
+                        - chunk_size: samples per transfer; the loop sleeps until about this
+                          many new samples are expected instead of spinning
+
+            return:     - (channels, n_samples) array, one row per enabled channel, or
+                          its first columns if on_chunk ended the record early;
+                          lost samples are filled with NaN. The number of lost and
+                          corrupt samples is kept in self.record_lost / self.record_corrupted
+        """
+        n_channels = len(self.channels)
+        # preallocate the whole record once, chunks are fetched straight into it
+        if out is not None:
+            record = out
+        elif filename is None:
+            record = np.empty((n_channels, n_samples))
+        else:
+            record = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=(n_channels, n_samples))
+
+        self.dwf.FDwfAnalogInAcquisitionModeSet(self.dev.handle, constants.acqmodeRecord)
+        self.dwf.FDwfAnalogInFrequencySet(self.dev.handle, sample_rate)
+        self.dwf.FDwfAnalogInRecordLengthSet(self.dev.handle, n_samples / sample_rate)
+
+        print("Starting record...")
+        self.dwf.FDwfAnalogInConfigure(self.dev.handle, False, True)
+
+        if chunk_size is None:
+            # a quarter of the device buffer leaves headroom against overflow
+            chunk_size = max(1, min(n_samples, self.dev.analog.input.max_buffer_size // 4))
+        chunk_period = chunk_size / sample_rate
+
+        status = ctypes.c_ubyte()
+        available = ctypes.c_int()
+        lost = ctypes.c_int()
+        corrupted = ctypes.c_int()
+        self.record_lost = 0
+        self.record_corrupted = 0
+        index = 0
+        stop = False
+        # bound once, these run on every poll
+        analog_in_status = self.dwf.FDwfAnalogInStatus
+        status_record = self.dwf.FDwfAnalogInStatusRecord
+        status_data = self.dwf.FDwfAnalogInStatusData
+        status_ref, available_ref, lost_ref, corrupted_ref = ctypes.byref(status), ctypes.byref(available), ctypes.byref(lost), ctypes.byref(corrupted)
+        try:
+            while index < n_samples:
+                analog_in_status(self.dev.handle, True, status_ref)
+                # nothing to read before the acquisition is running
+                if index == 0 and status.value in (constants.DwfStateConfig, constants.DwfStatePrefill, constants.DwfStateArmed):
+                    time.sleep(poll_interval)
+                    continue
+
+                status_record(self.dev.handle, available_ref, lost_ref, corrupted_ref)
+
+                # samples dropped by the device: keep the time base, mark them invalid
+                if lost.value > 0:
+                    skip = min(lost.value, n_samples - index)
+                    record[:, index:index + skip] = np.nan
+                    index += skip
+                    self.record_lost += lost.value
+                self.record_corrupted += corrupted.value
+
+                # the samples of this status call must be read before the next one
+                count = min(available.value, n_samples - index)
+                if count > 0:
+                    for row, i in enumerate(self.channels):
+                        # write the new chunk directly behind the previous one
+                        chunk = record[row, index:index + count]
+                        status_data(self.dev.handle, i-1, chunk.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), count)
+                    stop = on_chunk is not None and on_chunk(record, index, index + count)
+                    index += count
+                    if stop:
+                        # the callback has seen enough, end the record here
+                        break
+                elif status.value == constants.DwfStateDone:
+                    break
+
+                # sleep until the next chunk (or the end of the record) is expected
+                wait = min(chunk_size, n_samples - index) / sample_rate
+                time.sleep(min(max(wait, poll_interval), chunk_period))
+        finally:
+            # stop the acquisition and return to single-shot captures
+            self.dwf.FDwfAnalogInConfigure(self.dev.handle, False, False)
+            self.dwf.FDwfAnalogInAcquisitionModeSet(self.dev.handle, constants.acqmodeSingle)
+
+        if stop:
+            record = record[:, :index]
+        elif index < n_samples:
+            record[:, index:] = np.nan
+        if self.record_lost or self.record_corrupted:
+            print(f"Record warning: {self.record_lost} lost and {self.record_corrupted} corrupt samples")
+        print("Record done.")
+
+        return record
+
+    def wavegen_custom(self, waveform, frequency, amplitude=1.0, offset=0.0, channel=1):
+        """
+            plays a custom waveform on an analog-out channel
 
-    def __get_info__(self, device_data):
+            parameters: - waveform: one period, normalised to [-1, 1]
+                        - frequency: repetition rate of the period (Hz)
+                        - amplitude (V), offset (V)
+                        - channel: analog-out channel (1-based)
+        """
+        samples = np.ascontiguousarray(waveform, dtype=np.float64)
+        node = constants.AnalogOutNodeCarrier
+        self.dwf.FDwfAnalogOutNodeEnableSet(self.dev.handle, channel-1, node, True)
+        self.dwf.FDwfAnalogOutNodeFunctionSet(self.dev.handle, channel-1, node, constants.funcCustom)
+        self.dwf.FDwfAnalogOutNodeDataSet(self.dev.handle, channel-1, node, samples.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), len(samples))
+        self.dwf.FDwfAnalogOutNodeFrequencySet(self.dev.handle, channel-1, node, frequency)
+        self.dwf.FDwfAnalogOutNodeAmplitudeSet(self.dev.handle, channel-1, node, amplitude)
+        self.dwf.FDwfAnalogOutNodeOffsetSet(self.dev.handle, channel-1, node, offset)
+        self.dwf.FDwfAnalogOutConfigure(self.dev.handle, channel-1, True)
+
+    def wavegen_stop(self, channel=1):
+        """
+            stops and resets an analog-out channel
+        """
+        self.dwf.FDwfAnalogOutConfigure(self.dev.handle, channel-1, False)
+        self.dwf.FDwfAnalogOutReset(self.dev.handle, channel-1)
+
+    def scope_sample_rate(self):
+        """
+            returns the sample rate (Hz) the scope actually runs at, the requested
+            rate rounded to the ADC clock divider grid
+        """
+        rate = ctypes.c_double()
+        self.dwf.FDwfAnalogInFrequencyGet(self.dev.handle, ctypes.byref(rate))
+        return rate.value
+
+    def multisine_record(self, waveform, period, sample_rate, periods=2, amplitude=1.0, offset=0.0, channel=1, settle_periods=1):
+        """
+            plays a multisine period (see multisine()) on the analog-out and records
+            a whole number of periods on all enabled scope channels
+
+            parameters: - waveform: one period, normalised to [-1, 1]
+                        - period: duration of one period (s)
+                        - sample_rate: highest scope sample rate wanted (Hz)
+                        - periods: periods to record (at least, and at least 2, see multisine_impedance)
+                        - amplitude (V), offset (V), channel: analog-out settings
+                        - settle_periods: periods played before the capture starts
+
+            return:     - (channels, samples) array, see scope_record
+                        - the sample rate (Hz) the scope ran at, pass it to multisine_impedance
+        """
+        if periods < 2:
+            raise error("at least 2 periods are needed to keep the tones apart", "multisine_record", "scope")
+        # the ADC only runs at clock / D, so the rate and size come from the divider
+        # grid to keep a whole number of periods in the capture
+        sample_rate, buffer_size, periods, leakage = coherent_plan(1.0 / period, self.dev.analog.input.max_frequency,
+                                                                   int(round(periods * period * sample_rate)), sample_rate,
+                                                                   min_cycles=periods)
+        if leakage >= COHERENT_TOLERANCE:
+            print(f"Multisine warning: {periods} periods are {leakage:.1e} off whole at {sample_rate} Hz")
+        self.wavegen_custom(waveform, 1.0 / period, amplitude, offset, channel)
+        try:
+            time.sleep(settle_periods * period)
+            record = self.scope_record(sample_rate, buffer_size)
+            return record, self.scope_sample_rate()
+        finally:
+            self.wavegen_stop(channel)
+
+    def send_multisine(self, frequencies, phases):
+        """
+            asks the MCU to play a multisine instead of the analog-out (see encode_multisine)
+        """
+        self.uart_write_frame(encode_multisine(frequencies, phases))
+
+    def __get_info__(self, device_data, device_id=0, device_rev=0, config=0):
         """
             get and return device information
+
+            the capability groups are probed on first access only and are
+            stored in the capability cache, keyed by device id, revision and
+            configuration and refreshed when the WaveForms (firmware) version changes
         """
         # check WaveForms version
         version = ctypes.create_string_buffer(16)
-        if self.dwf.FDwfGetVersion(version) == 0:
-            self.check_error()
+        self.dwf.FDwfGetVersion(version)
         device_data.version = str(version.value)[2:-1]
 
-        # define temporal variables
-        temp1 = ctypes.c_int()
-        temp2 = ctypes.c_int()
-        temp3 = ctypes.c_int()
+        cache = capability_cache(str(device_id) + ":" + str(device_rev) + ":" + str(config), device_data.version)
+        device_data.analog.input = capabilities("analog.input", lambda: self.__probe_analog_input__(device_data.handle), cache)
+        device_data.analog.output = capabilities("analog.output", lambda: self.__probe_analog_output__(device_data.handle), cache)
+        device_data.analog.IO = capabilities("analog.IO", lambda: self.__probe_analog_io__(device_data.handle), cache)
+        device_data.digital.input = capabilities("digital.input", lambda: self.__probe_digital_input__(device_data.handle), cache)
+        device_data.digital.output = capabilities("digital.output", lambda: self.__probe_digital_output__(device_data.handle), cache)
+        return device_data
 
-        # analog input information
+    def __probe_analog_input__(self, handle):
+        """
+            analog input information
+        """
+        info = {}
+        temp1 = ctypes.c_int()
         # channel count
-        if self.dwf.FDwfAnalogInChannelCount(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.analog.input.channel_count = temp1.value
+        self.dwf.FDwfAnalogInChannelCount(handle, ctypes.byref(temp1))
+        info["channel_count"] = temp1.value
         # buffer size
-        if self.dwf.FDwfAnalogInBufferSizeInfo(device_data.handle, 0, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.analog.input.max_buffer_size = temp1.value
+        self.dwf.FDwfAnalogInBufferSizeInfo(handle, None, ctypes.byref(temp1))
+        info["max_buffer_size"] = temp1.value
         # ADC resolution
-        if self.dwf.FDwfAnalogInBitsInfo(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.analog.input.max_resolution = temp1.value
+        self.dwf.FDwfAnalogInBitsInfo(handle, ctypes.byref(temp1))
+        info["max_resolution"] = temp1.value
         # range information
         temp1 = ctypes.c_double()
         temp2 = ctypes.c_double()
         temp3 = ctypes.c_double()
-        if self.dwf.FDwfAnalogInChannelRangeInfo(device_data.handle, ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3)) == 0:
-            self.check_error()
-        device_data.analog.input.min_range = temp1.value
-        device_data.analog.input.max_range = temp2.value
-        device_data.analog.input.steps_range = int(temp3.value)
+        self.dwf.FDwfAnalogInChannelRangeInfo(handle, ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3))
+        info["min_range"] = temp1.value
+        info["max_range"] = temp2.value
+        info["steps_range"] = int(temp3.value)
         # offset information
-        if self.dwf.FDwfAnalogInChannelOffsetInfo(device_data.handle, ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3)) == 0:
-            self.check_error()
-        device_data.analog.input.min_offset = temp1.value
-        device_data.analog.input.max_offset = temp2.value
-        device_data.analog.input.steps_offset = int(temp3.value)
-
-        # analog output information
+        self.dwf.FDwfAnalogInChannelOffsetInfo(handle, ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3))
+        info["min_offset"] = temp1.value
+        info["max_offset"] = temp2.value
+        info["steps_offset"] = int(temp3.value)
+        # sample rate limits, the maximum is the ADC clock the rate is divided from
+        self.dwf.FDwfAnalogInFrequencyInfo(handle, ctypes.byref(temp1), ctypes.byref(temp2))
+        info["min_frequency"] = temp1.value
+        info["max_frequency"] = temp2.value
+        return info
+
+    def __probe_analog_output__(self, handle):
+        """
+            analog output information
+        """
+        info = {"node_count": [], "node_type": [], "max_buffer_size": [], "min_amplitude": [], "max_amplitude": [],
+                "min_offset": [], "max_offset": [], "min_frequency": [], "max_frequency": []}
         temp1 = ctypes.c_int()
-        if self.dwf.FDwfAnalogOutCount(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.analog.output.channel_count = temp1.value
-        for channel_index in range(device_data.analog.output.channel_count):
+        self.dwf.FDwfAnalogOutCount(handle, ctypes.byref(temp1))
+        info["channel_count"] = temp1.value
+        for channel_index in range(info["channel_count"]):
             # check node types and node count
             temp1 = ctypes.c_int()
-            if self.dwf.FDwfAnalogOutNodeInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.byref(temp1)) == 0:
-                self.check_error()
+            self.dwf.FDwfAnalogOutNodeInfo(handle, channel_index, ctypes.byref(temp1))
             templist = []
             for node_index in range(3):
                 if ((1 << node_index) & int(temp1.value)) == 0:
                     continue
-                elif node_index == constants.AnalogOutNodeCarrier.value:
+                elif node_index == constants.AnalogOutNodeCarrier:
                     templist.append("carrier")
-                elif node_index == constants.AnalogOutNodeFM.value:
+                elif node_index == constants.AnalogOutNodeFM:
                     templist.append("FM")
-                elif node_index == constants.AnalogOutNodeAM.value:
+                elif node_index == constants.AnalogOutNodeAM:
                     templist.append("AM")
-            device_data.analog.output.node_type.append(templist)
-            device_data.analog.output.node_count.append(len(templist))
+            info["node_type"].append(templist)
+            info["node_count"].append(len(templist))
             # buffer size
             templist = []
-            for node_index in range(device_data.analog.output.node_count[channel_index]):
-                if self.dwf.FDwfAnalogOutNodeDataInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), 0, ctypes.byref(temp1)) == 0:
-                    self.check_error()
+            for node_index in range(info["node_count"][channel_index]):
+                self.dwf.FDwfAnalogOutNodeDataInfo(handle, channel_index, node_index, None, ctypes.byref(temp1))
                 templist.append(temp1.value)
-            device_data.analog.output.max_buffer_size.append(templist)
-            # amplitude information
-            templist1 = []
-            templist2 = []
+            info["max_buffer_size"].append(templist)
+            # amplitude, offset and frequency information
             temp1 = ctypes.c_double()
             temp2 = ctypes.c_double()
-            for node_index in range(device_data.analog.output.node_count[channel_index]):
-                if self.dwf.FDwfAnalogOutNodeAmplitudeInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), ctypes.byref(temp1), ctypes.byref(temp2)) == 0:
-                    self.check_error()
-                templist1.append(temp1.value)
-                templist2.append(temp2.value)
-            device_data.analog.output.min_amplitude.append(templist1)
-            device_data.analog.output.max_amplitude.append(templist2)
-            # offset information
-            templist1 = []
-            templist2 = []
-            for node_index in range(device_data.analog.output.node_count[channel_index]):
-                if self.dwf.FDwfAnalogOutNodeOffsetInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), ctypes.byref(temp1), ctypes.byref(temp2)) == 0:
-                    self.check_error()
-                templist1.append(temp1.value)
-                templist2.append(temp2.value)
-            device_data.analog.output.min_offset.append(templist1)
-            device_data.analog.output.max_offset.append(templist2)
-            # frequency information
-            templist1 = []
-            templist2 = []
-            for node_index in range(device_data.analog.output.node_count[channel_index]):
-                if self.dwf.FDwfAnalogOutNodeFrequencyInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), ctypes.byref(temp1), ctypes.byref(temp2)) == 0:
-                    self.check_error()
-                templist1.append(temp1.value)
-                templist2.append(temp2.value)
-            device_data.analog.output.min_frequency.append(templist1)
-            device_data.analog.output.max_frequency.append(templist2)
-
-        # analog IO information
+            for name, function in (("amplitude", self.dwf.FDwfAnalogOutNodeAmplitudeInfo),
+                                   ("offset", self.dwf.FDwfAnalogOutNodeOffsetInfo),
+                                   ("frequency", self.dwf.FDwfAnalogOutNodeFrequencyInfo)):
+                templist1 = []
+                templist2 = []
+                for node_index in range(info["node_count"][channel_index]):
+                    function(handle, channel_index, node_index, ctypes.byref(temp1), ctypes.byref(temp2))
+                    templist1.append(temp1.value)
+                    templist2.append(temp2.value)
+                info["min_" + name].append(templist1)
+                info["max_" + name].append(templist2)
+        return info
+
+    def __probe_analog_io__(self, handle):
+        """
+            analog IO information
+        """
+        info = {"node_count": [], "channel_name": [], "channel_label": [], "node_name": [], "node_unit": [],
+                "min_set_range": [], "max_set_range": [], "min_read_range": [], "max_read_range": [],
+                "set_steps": [], "read_steps": []}
         # channel count
         temp1 = ctypes.c_int()
-        if self.dwf.FDwfAnalogIOChannelCount(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.analog.IO.channel_count = temp1.value
-        for channel_index in range(device_data.analog.IO.channel_count):
+        self.dwf.FDwfAnalogIOChannelCount(handle, ctypes.byref(temp1))
+        info["channel_count"] = temp1.value
+        for channel_index in range(info["channel_count"]):
             # channel names and labels
             temp1 = ctypes.create_string_buffer(256)
             temp2 = ctypes.create_string_buffer(256)
-            if self.dwf.FDwfAnalogIOChannelName(device_data.handle, ctypes.c_int(channel_index), temp1, temp2) == 0:
-                self.check_error()
-            device_data.analog.IO.channel_name.append(str(temp1.value)[2:-1])
-            device_data.analog.IO.channel_label.append(str(temp2.value)[2:-1])
+            self.dwf.FDwfAnalogIOChannelName(handle, channel_index, temp1, temp2)
+            info["channel_name"].append(str(temp1.value)[2:-1])
+            info["channel_label"].append(str(temp2.value)[2:-1])
             # check node count
             temp1 = ctypes.c_int()
-            if self.dwf.FDwfAnalogIOChannelInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.byref(temp1)) == 0:
-                self.check_error()
-            device_data.analog.IO.node_count.append(temp1.value)
+            self.dwf.FDwfAnalogIOChannelInfo(handle, channel_index, ctypes.byref(temp1))
+            info["node_count"].append(temp1.value)
             # node names and units
             templist1 = []
             templist2 = []
-            for node_index in range(device_data.analog.IO.node_count[channel_index]):
+            for node_index in range(info["node_count"][channel_index]):
                 temp1 = ctypes.create_string_buffer(256)
                 temp2 = ctypes.create_string_buffer(256)
-                if self.dwf.FDwfAnalogIOChannelNodeName(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), temp1, temp2) == 0:
-                    self.check_error()
+                self.dwf.FDwfAnalogIOChannelNodeName(handle, channel_index, node_index, temp1, temp2)
                 templist1.append(str(temp1.value)[2:-1])
                 templist2.append(str(temp2.value)[2:-1])
-            device_data.analog.IO.node_name.append(templist1)
-            device_data.analog.IO.node_unit.append(templist2)
-            # node write info
-            templist1 = []
-            templist2 = []
-            templist3 = []
+            info["node_name"].append(templist1)
+            info["node_unit"].append(templist2)
+            # node write and read info
             temp1 = ctypes.c_double()
             temp2 = ctypes.c_double()
             temp3 = ctypes.c_int()
-            for node_index in range(device_data.analog.IO.node_count[channel_index]):
-                if self.dwf.FDwfAnalogIOChannelNodeSetInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3)) == 0:
-                    self.check_error()
-                templist1.append(temp1.value)
-                templist2.append(temp2.value)
-                templist3.append(temp3.value)
-            device_data.analog.IO.min_set_range.append(templist1)
-            device_data.analog.IO.max_set_range.append(templist2)
-            device_data.analog.IO.set_steps.append(templist3)
-            # node read info
-            templist1 = []
-            templist2 = []
-            templist3 = []
-            for node_index in range(device_data.analog.IO.node_count[channel_index]):
-                if self.dwf.FDwfAnalogIOChannelNodeStatusInfo(device_data.handle, ctypes.c_int(channel_index), ctypes.c_int(node_index), ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3)) == 0:
-                    self.check_error()
-                templist1.append(temp1.value)
-                templist2.append(temp2.value)
-                templist3.append(temp3.value)
-            device_data.analog.IO.min_read_range.append(templist1)
-            device_data.analog.IO.max_read_range.append(templist2)
-            device_data.analog.IO.read_steps.append(templist3)
-
-        # digital input information
-        # channel count
+            for prefix, function in (("set", self.dwf.FDwfAnalogIOChannelNodeSetInfo),
+                                     ("read", self.dwf.FDwfAnalogIOChannelNodeStatusInfo)):
+                templist1 = []
+                templist2 = []
+                templist3 = []
+                for node_index in range(info["node_count"][channel_index]):
+                    function(handle, channel_index, node_index, ctypes.byref(temp1), ctypes.byref(temp2), ctypes.byref(temp3))
+                    templist1.append(temp1.value)
+                    templist2.append(temp2.value)
+                    templist3.append(temp3.value)
+                info["min_" + prefix + "_range"].append(templist1)
+                info["max_" + prefix + "_range"].append(templist2)
+                info[prefix + "_steps"].append(templist3)
+        return info
+
+    def __probe_digital_input__(self, handle):
+        """
+            digital input information
+        """
         temp1 = ctypes.c_int()
-        if self.dwf.FDwfDigitalInBitsInfo(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.digital.input.channel_count = temp1.value
+        # channel count
+        self.dwf.FDwfDigitalInBitsInfo(handle, ctypes.byref(temp1))
+        channel_count = temp1.value
         # buffer size
-        if self.dwf.FDwfDigitalInBufferSizeInfo(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.digital.input.max_buffer_size = temp1.value
+        self.dwf.FDwfDigitalInBufferSizeInfo(handle, ctypes.byref(temp1))
+        return {"channel_count": channel_count, "max_buffer_size": temp1.value}
 
-        # digital output information
+    def __probe_digital_output__(self, handle):
+        """
+            digital output information
+        """
+        temp1 = ctypes.c_int()
         # channel count
-        if self.dwf.FDwfDigitalOutCount(device_data.handle, ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.digital.output.channel_count = temp1.value
+        self.dwf.FDwfDigitalOutCount(handle, ctypes.byref(temp1))
+        channel_count = temp1.value
         # buffer size
-        if self.dwf.FDwfDigitalOutDataInfo(device_data.handle, ctypes.c_int(0), ctypes.byref(temp1)) == 0:
-            self.check_error()
-        device_data.digital.output.max_buffer_size = temp1.value
-
-        return device_data
+        temp1 = ctypes.c_uint()
+        self.dwf.FDwfDigitalOutDataInfo(handle, 0, ctypes.byref(temp1))
+        return {"channel_count": channel_count, "max_buffer_size": temp1.value}
 
     def close(self):
         """
             close a specific device
         """
-        if self.dwf.FDwfDigitalUartReset(self.dev.handle) == 0:
-            self.check_error()
+        self.dwf.FDwfDigitalUartReset(self.dev.handle)
             
-        if self.dev.handle != 0:
+        if self.dev.handle.value != constants.hdwfNone:
             self.dwf.FDwfDeviceClose(self.dev.handle)
-        data.handle = ctypes.c_int(0)
-        data.name = ""
+        self.dev.handle = ctypes.c_int(0)
+        self.dev.name = ""
+        return
+
+class device_pool:
+    """
+        several MyDigilent instruments opened by serial number, with concurrent
+        captures on all of them (the SDK calls release the GIL)
+    """
+    def __init__(self, serials, channels=[1, 2, 3, 4], **kwargs):
+        """
+            serials: serial numbers of the devices to open
+            channels: scope channels enabled on every device
+            kwargs: passed to MyDigilent (rx, tx, baud_rate, config, ...)
+        """
+        self.devices = []
+        try:
+            for serial in serials:
+                device = MyDigilent(serial=serial, **kwargs)
+                device.scope_setup(channels=channels)
+                self.devices.append(device)
+        except Exception:
+            self.close()
+            raise
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.devices)))
+
+    def scope_record(self, sample_rate=1e3, buffer_size=300, **kwargs):
+        """
+            captures on all devices at the same time
+
+            return:     - list of the scope_record results, in the order of the serial numbers
+        """
+        futures = [self.executor.submit(device.scope_record, sample_rate, buffer_size, **kwargs) for device in self.devices]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+            closes every device of the pool
+        """
+        if getattr(self, "executor", None) is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for device in self.devices:
+            device.close()
+        self.devices = []
         return
\ No newline at end of file
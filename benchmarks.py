@@ -0,0 +1,484 @@
+"""
+   Micro-benchmarks for the acquisition and DSP paths
+
+   run:  python benchmarks.py [name ...]
+   without arguments every benchmark is run
+"""
+
+import ctypes, sys, timeit
+
+def _report(label, seconds, calls):
+    print(f"  {label:<40s} {seconds / calls * 1e6:10.3f} us/call")
+
+def bench_dwf_calls(calls=200000):
+    """per-call overhead of untyped vs. typed (dwfbindings) SDK calls"""
+    import dwfbindings
+    print("dwf call overhead (FDwfGetLastError):")
+    try:
+        untyped = ctypes.cdll.LoadLibrary(dwfbindings.library_path())
+    except OSError as err:
+        print(f"  skipped, the dwf library is not available ({err})")
+        return
+    # separate CDLL instance, its functions keep the default (untyped) behaviour
+    typed = dwfbindings.bind(ctypes.cdll.LoadLibrary(dwfbindings.library_path()))
+
+    def before():
+        # fresh ctypes objects, attribute lookup and manual check, as MyDigilent did
+        err_nr = ctypes.c_int()
+        if untyped.FDwfGetLastError(ctypes.byref(err_nr)) == 0:
+            pass
+
+    typed_call = typed.FDwfGetLastError
+    err_nr = ctypes.c_int()
+    err_ref = ctypes.byref(err_nr)
+    def after():
+        typed_call(err_ref)
+
+    _report("untyped, per-call wrapping", timeit.timeit(before, number=calls), calls)
+    _report("typed, pre-bound", timeit.timeit(after, number=calls), calls)
+
+def _lstsq_clean_buffer(y_buffer, signal_freq, sample_rate):
+    """clean_buffer before sinefit: N x 3 design matrix and np.linalg.lstsq"""
+    import numpy as np
+    n_samples = len(y_buffer)
+    t = np.arange(n_samples) / sample_rate
+    omega = 2 * np.pi * signal_freq
+    M = np.vstack([np.sin(omega * t), np.cos(omega * t), np.ones(n_samples)]).T
+    coeffs, _, _, _ = np.linalg.lstsq(M, y_buffer, rcond=None)
+    a, b, c = coeffs
+    y_clean = a * np.sin(omega * t) + b * np.cos(omega * t) + c
+    return y_clean, (np.sqrt(a**2 + b**2), np.arctan2(b, a), c)
+
+def _noisy_sine(n_samples, signal_freq, sample_rate, noise=0.05, seed=0):
+    import numpy as np
+    t = np.arange(n_samples) / sample_rate
+    rng = np.random.default_rng(seed)
+    return 0.3 * np.sin(2 * np.pi * signal_freq * t + 0.4) + 0.1 + rng.normal(0, noise, n_samples)
+
+def bench_sinefit(n_samples=2**20, repeats=5):
+    """lstsq vs. closed-form sine fit on a max-size buffer"""
+    import numpy as np
+    import sinefit
+    from MyDigilent import clean_buffer
+    fs, f = 1e6, 1234.5
+    y = _noisy_sine(n_samples, f, fs)
+    block = np.stack([y, y, y, y])
+    print(f"sine fit, N = {n_samples}:")
+    _report("lstsq clean_buffer (before)", timeit.timeit(lambda: _lstsq_clean_buffer(y, f, fs), number=repeats), repeats)
+    sinefit.basis.cache_clear()
+    _report("clean_buffer", timeit.timeit(lambda: clean_buffer(y, f, fs), number=repeats), repeats)
+    _report("clean_buffer, cached basis", timeit.timeit(lambda: clean_buffer(y, f, fs, cache=True), number=repeats), repeats)
+    _report("fit3, cached basis", timeit.timeit(lambda: sinefit.fit3(y, f, fs), number=repeats), repeats)
+    _report("fit3, 4 channels batched", timeit.timeit(lambda: sinefit.fit3(block, f, fs), number=repeats), repeats)
+    _report("fit4 (frequency estimate)", timeit.timeit(lambda: sinefit.fit4(y, f * 1.0001, fs), number=repeats), repeats)
+
+def _scan_freq_selection(y_buffer, freq_sweep, sample_rate):
+    """freq_selection_signal before the golden-section search: fixed-step amplitude scan"""
+    import numpy as np
+    import sinefit
+    mamp = 0
+    freq = []
+    c = 0
+    if freq_sweep[0]/0.9999 >= 0.1:
+        freq_int = 0.1 * freq_sweep[0]/0.9999
+    else:
+        freq_int = 1e-5 * freq_sweep[0]/0.9999
+    for f in np.arange(freq_sweep[0], freq_sweep[1], freq_int):
+        amplitude, _, _ = sinefit.amplitude_phase(sinefit.fit3(y_buffer, f, sample_rate))
+        if amplitude > mamp:
+            mamp = amplitude
+            freq.append(f)
+        else:
+            c += 1
+            if c >= 3:
+                break
+    return freq[-1]
+
+def bench_freq_estimate(trials=5):
+    """fixed-step scan vs. DFT bracket + golden-section frequency search"""
+    import numpy as np
+    from MyDigilent import freq_selection_signal
+    print("frequency estimate in [0.998 f, 1.002 f] (mean |error| / time per call):")
+    # (signal frequency offset from the nominal f, sample rate, samples) as planned by serverCode
+    cases = ((0.05, 1.0003, 16.384, 2**14), (0.0123, 0.9991, 1.6384, 2**14), (1234.5, 1.0012, 1e5, 2**17))
+    for f, offset, fs, n in cases:
+        band = [f * 0.998, f * 1.002]
+        for label, estimate in (("scan (before)", _scan_freq_selection), ("golden section", freq_selection_signal)):
+            errors, seconds = [], 0.0
+            for seed in range(trials):
+                y = _noisy_sine(n, f * offset, fs, seed=seed)
+                seconds += timeit.timeit(lambda: errors.append(abs(estimate(y, band, fs) - f * offset)), number=1)
+            print(f"  f = {f:<8g} {label:<16s} {np.mean(errors) / f:10.2e} rel {seconds / trials * 1e3:10.3f} ms/call")
+
+def bench_zoom_fft(n_samples=2**20, repeats=5):
+    """full rfft + mask vs. chirp-Z zoom spectrum for the narrow-band peak search"""
+    import MyDigilent
+    from MyDigilent import FFT, zoom_FFT
+    fs, f = 1e6, 1234.5
+    band = [f * 0.99, f * 1.01]
+    y = _noisy_sine(n_samples, f * 1.0003, fs)
+    print(f"narrow-band peak search, N = {n_samples}, band = +-1 %:")
+    for label, spectrum in (("FFT (before)", lambda: FFT(y, band, fs)),
+                            ("zoom_FFT, 256 points", lambda: zoom_FFT(y, band, fs))):
+        spectrum()
+        _report(label, timeit.timeit(spectrum, number=repeats), repeats)
+        print(f"  {'':<40s} peak error {abs(spectrum()[4] - f * 1.0003):10.3e} Hz")
+    # the same resolution from a plain FFT needs the buffer zero-padded
+    import numpy as np
+    padded = int(fs / (band[1] - band[0]) * 255)
+    _report(f"rfft zero-padded to {padded} points", timeit.timeit(lambda: np.fft.rfft(y * np.hanning(n_samples), padded), number=repeats), repeats)
+
+    # serverCode's zoom points: decimated to 1024 samples per period, +-rng_int band
+    print("sweep of zoom points as serverCode runs them (1024 samples per period):")
+    points = [(f, 20 if f <= 10 else 50, 0.001 if f <= 1 else 0.01 if f <= 10 else 0.1 if f <= 100 else 1.0)
+              for f in np.logspace(-0.9, 3, 16)]
+    captures = [(_noisy_sine(cycles * 1024, f, f * 1024), f, rng_int) for f, cycles, rng_int in points]
+    def sweep(spectrum):
+        return [spectrum(y, [f * (1 - rng_int), f * (1 + rng_int)], f * 1024) for y, f, rng_int in captures]
+    MyDigilent._czt_kernels.cache_clear()
+    sweep(zoom_FFT)
+    entries, size = MyDigilent._czt_kernels.cache_info()
+    print(f"  kernel cache after one sweep: {entries} entries, {size / 2**20:.1f} MB")
+    _report("FFT (before)", timeit.timeit(lambda: sweep(FFT), number=repeats), repeats)
+    _report("zoom_FFT, cached kernels", timeit.timeit(lambda: sweep(zoom_FFT), number=repeats), repeats)
+
+def _trig_dual_phase_demod(y_buffer, signal_freq, sample_rate):
+    """dual_phase_demod before the demodulator: references rebuilt on every call"""
+    import numpy as np
+    t = np.arange(len(y_buffer)) / sample_rate
+    X = np.mean(y_buffer * np.sin(2 * np.pi * signal_freq * t))
+    Y = np.mean(y_buffer * np.cos(2 * np.pi * signal_freq * t))
+    return 2 * np.sqrt(X**2 + Y**2), np.arctan2(Y, X)
+
+def bench_demod(n_samples=2**20, repeats=5):
+    """four dual_phase_demod calls vs. one block demodulation"""
+    import numpy as np
+    from MyDigilent import demodulator
+    fs, f = 1e6, 1234.5
+    block = np.stack([_noisy_sine(n_samples, f, fs, seed=seed) for seed in range(4)])
+    demod = demodulator()
+    print(f"demodulation of I, V1, V2, V3, N = {n_samples}:")
+    _report("4 x dual_phase_demod (before)", timeit.timeit(lambda: [_trig_dual_phase_demod(y, f, fs) for y in block], number=repeats), repeats)
+    _report("demodulator, one stacked product", timeit.timeit(lambda: demod(block, f, fs), number=repeats), repeats)
+
+def _direct_fir_bandpass(signal, fs, f_low, f_high, num_taps):
+    """fir_bandpass before the filter bank: taps redesigned, two convolutions over a 3 x taps reflect pad"""
+    import numpy as np
+    from MyDigilent import filter_bank
+    h = filter_bank.design(fs, f_low, f_high, num_taps)
+    pad = num_taps * 3
+    padded = np.pad(signal, pad, mode='reflect')
+    fwd = np.convolve(padded, h, mode='same')
+    rev = np.convolve(fwd[::-1], h, mode='same')[::-1]
+    return rev[pad:-pad]
+
+def bench_fir(repeats=20):
+    """fir_bandpass before vs. the cached filter bank, direct and overlap-save, per 4-channel block"""
+    import numpy as np
+    from MyDigilent import filter_bank, FIR_DIRECT_WORK
+    fs, f = 1e5, 1234.5
+    direct, fft = filter_bank(direct_work=np.inf), filter_bank(direct_work=0)
+    print(f"bandpass of I, V1, V2, V3 (ms per block; kernel x samples, automatic switch at {FIR_DIRECT_WORK}):")
+    print(f"  {'taps':>5s} {'samples':>8s} {'work':>10s} {'before':>9s} {'direct':>9s} {'fft':>9s}")
+    for num_taps in (15, 63, 255):
+        for n_samples in (2**8, 2**10, 2**12, 2**16, 2**20):
+            block = np.stack([_noisy_sine(n_samples, f, fs, seed=seed) for seed in range(4)])
+            calls = max(1, repeats * 2**12 // n_samples)
+            times = [timeit.timeit(run, number=calls) / calls * 1e3 for run in (
+                lambda: [_direct_fir_bandpass(y, fs, f * 0.8, f * 1.2, num_taps) for y in block],
+                lambda: direct(block, fs, f * 0.8, f * 1.2, num_taps),
+                lambda: fft(block, fs, f * 0.8, f * 1.2, num_taps))]
+            work = (2 * num_taps - 1) * n_samples
+            print(f"  {num_taps:5d} {n_samples:8d} {work:10d} {times[0]:9.3f} {times[1]:9.3f} {times[2]:9.3f}")
+
+def bench_decimate(n_samples=2**20, repeats=3):
+    """bandpass + demodulation of I, V1, V2, V3 on the raw capture vs. after polyphase decimation"""
+    import numpy as np
+    from MyDigilent import decimator, decimation_factor, demodulator, fir_bandpass
+    decim, demod = decimator(), demodulator()
+    print(f"low-frequency point DSP, N = {n_samples} (ms per point / max impedance ratio error):")
+    for f, ncycle in ((0.05, 2), (1, 12), (10, 20)):
+        # sample rate as planned by serverCode.plan_point for a full buffer
+        fs = n_samples / (ncycle / f)
+        t = np.arange(n_samples) / fs
+        rng = np.random.default_rng(0)
+        block = np.stack([(1 + 0.5 * i) * np.sin(2 * np.pi * f * t + p) + rng.normal(0, 0.2, n_samples)
+                          for i, p in enumerate((0.1, 0.5, 1.0, -0.3))])
+
+        def point(factor):
+            raw = decim(block, factor)
+            amps, phases = demod(fir_bandpass(raw, fs / factor, f * 0.8, f * 1.2), f, fs / factor)
+            amps = amps / decim.gain(f, fs, factor)
+            return amps[1:] / amps[0] * np.exp(1j * (phases[1:] - phases[0]))
+
+        Z = point(1)
+        for spp in (None, 256, 1024, 4096):
+            factor = decimation_factor(f, fs, spp)
+            seconds = timeit.timeit(lambda: point(factor), number=repeats) / repeats
+            error = np.max(np.abs(point(factor) - Z) / np.abs(Z))
+            label = f"{spp} samples/period, factor {factor}" if spp else "undecimated (before)"
+            print(f"  f = {f:<5g} {label:<34s} {seconds * 1e3:9.3f} ms {error:10.2e}")
+
+def bench_lockin(n_samples=2**20, chunk_size=2**14, repeats=5):
+    """latency after the last chunk: whole-buffer demodulation vs. the streaming lock-in"""
+    import numpy as np
+    from MyDigilent import demodulator, lockin
+    fs, f = 1e4, 0.5
+    block = np.stack([_noisy_sine(n_samples, f, fs, seed=seed) for seed in range(4)])
+    demod = demodulator()
+    print(f"I, V1, V2, V3 result after the capture, N = {n_samples}, chunks of {chunk_size}:")
+    _report("mean removal + demodulator (before)", timeit.timeit(lambda: demod(block - block.mean(axis=1, keepdims=True), f, fs), number=repeats), repeats)
+    lock = lockin(f, fs, channels=4, remove_mean=True)
+    for start in range(0, n_samples - chunk_size, chunk_size):
+        lock.update(block[:, start:start + chunk_size], start)
+    last = n_samples - chunk_size
+    _report("lockin, last chunk", timeit.timeit(lambda: lock.update(block[:, last:], last), number=repeats), repeats)
+    lock.reset()
+    _report("lockin, every chunk (during the capture)", timeit.timeit(
+        lambda: [lock.update(block[:, start:start + chunk_size], start) for start in range(0, n_samples, chunk_size)], number=repeats), repeats)
+
+def bench_early_stop(max_periods=200, chunk_size=256):
+    """periods needed to reach the impedance confidence target vs. noise, per-period lock-in"""
+    import numpy as np
+    from MyDigilent import period_lockin
+    fs, f, target = 1e3, 3.7, 1e-3
+    n_samples = int(max_periods * fs / f)
+    t = np.arange(n_samples) / fs
+    current = 0.5 * np.sin(2 * np.pi * f * t + 0.2)
+    voltage = 0.3 * np.sin(2 * np.pi * f * t + 1.0)
+    Z = 0.3 * np.exp(1j) / (0.5 * np.exp(0.2j))
+    print(f"early stopping at a {target:g} relative confidence interval, up to {max_periods} periods:")
+    for noise in (0.0003, 0.003, 0.01, 0.03):
+        block = np.stack((current, voltage)) + np.random.default_rng(0).normal(0, noise, (2, n_samples))
+        for estimator in ("median", "trimmed"):
+            lock = period_lockin(f, fs, channels=2, estimator=estimator, target=target)
+            start = 0
+            while start < n_samples and not lock.update(block[:, start:start + chunk_size], start):
+                start += chunk_size
+            ratio, interval = lock.interval()
+            print(f"  noise {noise:<7g} {estimator:<8s} {len(lock.phasors):5d} periods, "
+                  f"CI {interval[0]:9.2e}, error {abs(ratio[0] - Z) / abs(Z):9.2e}")
+
+def _plan_point(f, buffer_size, fsample_max=1e6):
+    """serverCode.plan_point: (sample_rate, ncycle) from the cycle-count heuristics"""
+    import numpy as np
+    sample_rate = int(fsample_max)
+    ncycle = int(buffer_size/(sample_rate/f))
+    if f < 0.1:
+        ncycle = 2
+        sample_rate = int(buffer_size / (ncycle / f))
+    elif f <= 10 and f >= 0.1:
+        ncycle = int(7.5*np.log10(f)+12.5)
+        sample_rate = int(buffer_size / (ncycle / f))
+    else:
+        est_ncycle = int(0.6228 * np.exp(2.2101*np.log10(f)))
+        while (ncycle < est_ncycle):
+            sample_rate = int(sample_rate * 0.9)
+            ncycle = int(buffer_size/(sample_rate/f))
+        if ncycle < 2:
+            ncycle = 2
+            sample_rate = int(f*buffer_size/ncycle)
+    return sample_rate, ncycle
+
+def bench_coherent(buffer_size=2**17, clock=125e6, source_error=50e-6, repeats=3):
+    """heuristic plan + bandpass + frequency re-estimate vs. coherent plan + single-bin demodulation"""
+    import numpy as np
+    from MyDigilent import coherent_plan, demodulator, fir_bandpass, freq_selection_signal, zoom_FFT
+    demod = demodulator()
+    true = 0.6 * np.exp(0.8j)
+    print(f"impedance ratio per point, N <= {buffer_size}, source off by {source_error:g} (ms per point / relative error):")
+
+    def block(f, fs, n):
+        t = np.arange(n) / fs
+        f_source = f * (1 + source_error)
+        return np.stack((0.5 * np.sin(2 * np.pi * f_source * t + 0.2) + 0.01,
+                         0.3 * np.sin(2 * np.pi * f_source * t + 1.0) + 0.02))
+
+    def ratio(amps, phases):
+        return amps[1] / amps[0] * np.exp(1j * (phases[1] - phases[0]))
+
+    for f in (0.031623, 1.0, 31.623, 3162.3):
+        fs, ncycle = _plan_point(f, buffer_size)
+        y = block(f, fs, buffer_size)
+        y = y - y.mean(axis=1, keepdims=True)
+
+        def before():
+            filtered = fir_bandpass(y, fs, f * 0.8, f * 1.2)
+            rng_int = 1 / 10 ** int(-np.log10(f) + 3)
+            if rng_int < 0.001:
+                sfreq = freq_selection_signal(filtered[0], [f * 0.998, f * 1.002], fs)
+            else:
+                sfreq = zoom_FFT(filtered[0], [f * (1 - rng_int), f * (1 + rng_int)], fs)[4]
+            return ratio(*demod(filtered, sfreq, fs))
+
+        rate, n, cycles, leakage = coherent_plan(f, clock, buffer_size, 1e6, min_cycles=ncycle, source_error=source_error)
+        z = block(f, rate, n)
+        after = lambda: ratio(*demod(z, f, rate))
+        for label, run in (("heuristic plan (before)", before), (f"coherent, leakage {leakage:.1e}", after)):
+            seconds = timeit.timeit(run, number=repeats) / repeats
+            print(f"  f = {f:<8g} {label:<28s} {seconds * 1e3:9.3f} ms {abs(run() - true) / abs(true):10.2e}")
+
+def _per_cell_impedance(amps, phases, sfreq, samples, row, dc):
+    """serverCode before the impedance engine: the per-cell phasor, division and row math, uncalibrated"""
+    import numpy as np
+    Iamp, Iphase = amps[0] / 0.033, phases[0]
+    I_comp = Iamp * np.cos(Iphase+np.pi) + 1j * Iamp * np.sin(Iphase+np.pi)
+    for k in range(1, len(amps)):
+        V_comp = amps[k] * np.cos(phases[k]) + 1j * amps[k] * np.sin(phases[k])
+        Z = V_comp / I_comp
+        Zreal, Zimag = Z.real, -Z.imag
+        sample = samples[k - 1]
+        sample[row, 0] = dc[k]
+        sample[row, 1] = np.log10(sfreq)
+        sample[row, 2] = Zreal
+        sample[row, 3] = Zimag
+        sample[row, 4] = np.abs(Zreal - 1j * Zimag)
+        sample[row, 5] = np.angle(Zreal - 1j * Zimag, deg=True)
+
+def bench_impedance(calls=2000):
+    """per-frequency Python overhead of the impedance math for 3, 8 and 16 cells (uncalibrated)"""
+    import numpy as np
+    from MyDigilent import impedance_engine
+    print("impedance math per frequency point:")
+    for cells in (3, 8, 16):
+        rng = np.random.default_rng(0)
+        amps, phases, dc = rng.random(cells + 1), rng.uniform(-np.pi, np.pi, cells + 1), rng.random(cells + 1)
+        samples = [np.zeros((31, 6)) for _ in range(cells)]
+        engine = impedance_engine([None] * cells, n_freq=31)
+        def after():
+            Zreal, Zimag = engine.correct(1.0, engine.impedance(amps, phases))
+            engine.record(5, 1.0, Zreal, Zimag, dc)
+        _report(f"{cells:2d} cells, per-cell math (before)", timeit.timeit(lambda: _per_cell_impedance(amps, phases, 1.0, samples, 5, dc), number=calls), calls)
+        _report(f"{cells:2d} cells, impedance_engine", timeit.timeit(after, number=calls), calls)
+
+def _interp_correct(calibrator, freqs, Z_real, Z_imag):
+    """HolderCalibrator.correct before the precomputed tables: mask, log10 of the grid and two np.interp per call"""
+    import numpy as np
+    from MyDigilent import _interp_complex
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+    Z_out = np.atleast_1d(np.asarray(Z_real, dtype=float)) + 1j * np.atleast_1d(np.asarray(Z_imag, dtype=float))
+    in_range = (freqs >= calibrator.freqs.min()) & (freqs <= calibrator.freqs.max())
+    if in_range.any():
+        Z_out[in_range] = (Z_out[in_range] - calibrator.additive_shift) * _interp_complex(calibrator.freqs, calibrator.Z_correction_ratio, freqs[in_range])
+    if len(freqs) == 1:
+        return float(Z_out.real[0]), float(Z_out.imag[0])
+    return Z_out.real, Z_out.imag
+
+def bench_calibrator(sweeps=1000, calls=20000):
+    """HolderCalibrator.correct per point and on an archive of whole sweeps"""
+    import numpy as np
+    from MyDigilent import HolderCalibrator
+    rng = np.random.default_rng(0)
+    grid = np.logspace(1, -2, 31)
+    calibrator = HolderCalibrator(np.column_stack((grid, 0.04 + 0.01 * rng.random(31), 0.01 * rng.random(31))),
+                                  np.column_stack((grid, 0.07 + 0.01 * rng.random(31), 0.01 * rng.random(31))))
+    print(f"calibration, one point and {sweeps} archived sweeps of 31 points:")
+    _report("one point, interp (before)", timeit.timeit(lambda: _interp_correct(calibrator, 0.5, 0.1, 0.02), number=calls), calls)
+    _report("one point, tables", timeit.timeit(lambda: calibrator.correct(0.5, 0.1, 0.02), number=calls), calls)
+    freqs = np.broadcast_to(grid * (1 + 0.01 * rng.standard_normal((sweeps, 31))), (sweeps, 31))
+    Z_real, Z_imag = 0.1 * rng.random((sweeps, 31)), 0.02 * rng.random((sweeps, 31))
+    _report("archive, interp per point (before)", timeit.timeit(
+        lambda: [_interp_correct(calibrator, f, r, i) for f, r, i in zip(freqs.flat, Z_real.flat, Z_imag.flat)], number=1), 1)
+    _report("archive, one call", timeit.timeit(lambda: calibrator.correct(freqs, Z_real, Z_imag), number=10), 10)
+
+def bench_calibrator_bank(calls=2000):
+    """one HolderCalibrator.correct per cell vs. one CalibratorBank call per frequency"""
+    import numpy as np
+    from MyDigilent import HolderCalibrator, CalibratorBank
+    rng = np.random.default_rng(0)
+    grid = np.logspace(1, -2, 31)
+    print("calibration of every cell at one frequency:")
+    for cells in (3, 12, 48):
+        calibrators = [HolderCalibrator(np.column_stack((grid, 0.04 + 0.01 * rng.random(31), 0.01 * rng.random(31))),
+                                        np.column_stack((grid, 0.07 + 0.01 * rng.random(31), 0.01 * rng.random(31))))
+                       for _ in range(cells)]
+        bank = CalibratorBank(calibrators)
+        Z_real, Z_imag = 0.1 * rng.random(cells), 0.02 * rng.random(cells)
+        _report(f"{cells:2d} cells, per-cell correct (before)", timeit.timeit(
+            lambda: [c.correct(0.5, Z_real[k], Z_imag[k]) for k, c in enumerate(calibrators)], number=calls), calls)
+        _report(f"{cells:2d} cells, CalibratorBank", timeit.timeit(lambda: bank.correct(0.5, Z_real, Z_imag), number=calls), calls)
+
+def bench_calibration_store(calls=20):
+    """holder calibration at startup: eager build from the files vs. lazy, cached CalibrationStore"""
+    import os, tempfile
+    import numpy as np
+    from MyDigilent import HolderCalibrator, CalibrationStore, smooth_impedance_array
+    rng = np.random.default_rng(0)
+
+    def write(directory, name, points):
+        grid = np.logspace(1, -2, points)
+        for kind, base in (("ref", 0.04), ("meas", 0.07)):
+            sweep = np.column_stack((grid, base + 0.01 * rng.random(points), 0.01 * rng.random(points)))
+            np.savetxt(os.path.join(directory, f"{name}.{kind}.csv"), sweep, delimiter=", ")
+
+    def before(directory, names):
+        # every holder on file parsed, smoothed and built at startup
+        return [HolderCalibrator(np.loadtxt(os.path.join(directory, name + ".ref.csv"), delimiter=","),
+                                 smooth_impedance_array(np.loadtxt(os.path.join(directory, name + ".meas.csv"),
+                                                                   delimiter=","), window_size=5))
+                for name in names]
+
+    print("startup with 3 holders in use:")
+    with tempfile.TemporaryDirectory() as root:
+        for holders, points in ((3, 31), (3, 4096), (300, 31)):
+            directory = os.path.join(root, f"{holders}x{points}")
+            cache_dir = os.path.join(root, f"{holders}x{points}.cache")
+            os.mkdir(directory)
+            names = [f"cell{k}" for k in range(holders)]
+            for name in names:
+                write(directory, name, points)
+            used = names[:3]
+            CalibrationStore(directory, cache_dir=cache_dir).bank(used)
+            label = f"{holders:3d} x {points:4d} pts"
+            _report(f"{label}, eager (before)", timeit.timeit(lambda: before(directory, names), number=calls), calls)
+            _report(f"{label}, CalibrationStore", timeit.timeit(
+                lambda: CalibrationStore(directory, cache_dir=cache_dir).bank(used), number=calls), calls)
+
+def _box_smooth(data_array, window_size):
+    """smooth_impedance_array before: sort, then one box convolution per column and spectrum"""
+    import numpy as np
+    sorted_data = data_array[np.argsort(data_array[:, 0])].copy()
+    box = np.ones(window_size) / window_size
+    pad_size = window_size // 2
+    columns = [np.convolve(np.pad(sorted_data[:, k], (pad_size, pad_size), mode='edge'), box, mode='valid') for k in (1, 2)]
+    return np.column_stack((sorted_data[:, 0], *columns))
+
+def bench_smooth(sweeps=1000):
+    """smooth_impedance_array one spectrum at a time vs. batched running sums"""
+    import numpy as np
+    from MyDigilent import smooth_impedance_array
+    rng = np.random.default_rng(0)
+    print(f"smoothing {sweeps} archived sweeps of 31 points and one sweep of 65536 points:")
+    archive = np.stack([np.column_stack((np.logspace(1, -2, 31), rng.random(31), rng.random(31))) for _ in range(sweeps)])
+    sweep = np.column_stack((np.logspace(1, -2, 65536), rng.random(65536), rng.random(65536)))
+    for window in (5, 51):
+        _report(f"archive, w={window}, per sweep (before)", timeit.timeit(
+            lambda: [_box_smooth(spectrum, window) for spectrum in archive], number=5), 5)
+        _report(f"archive, w={window}, batched", timeit.timeit(lambda: smooth_impedance_array(archive, window), number=5), 5)
+        _report(f"archive, w={window}, batched savgol", timeit.timeit(
+            lambda: smooth_impedance_array(archive, window, method="savgol"), number=5), 5)
+        _report(f"long sweep, w={window} (before)", timeit.timeit(lambda: _box_smooth(sweep, window), number=20), 20)
+        _report(f"long sweep, w={window}", timeit.timeit(lambda: smooth_impedance_array(sweep, window), number=20), 20)
+
+BENCHMARKS = {
+    "dwf_calls": bench_dwf_calls,
+    "sinefit": bench_sinefit,
+    "freq_estimate": bench_freq_estimate,
+    "zoom_fft": bench_zoom_fft,
+    "demod": bench_demod,
+    "fir": bench_fir,
+    "decimate": bench_decimate,
+    "lockin": bench_lockin,
+    "early_stop": bench_early_stop,
+    "coherent": bench_coherent,
+    "impedance": bench_impedance,
+    "calibrator": bench_calibrator,
+    "calibrator_bank": bench_calibrator_bank,
+    "calibration_store": bench_calibration_store,
+    "smooth": bench_smooth,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
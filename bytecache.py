@@ -0,0 +1,69 @@
+"""
+   Memoisation bounded by memory
+
+   functools.lru_cache bounds a cache by its number of entries, which says
+   nothing about its size when the results are arrays as long as a capture.
+   byte_cache keeps the most recently used results of a function of hashable
+   arguments until their arrays add up to max_bytes (and, optionally, until
+   there are max_entries of them); a result larger than the whole budget is
+   returned without being kept.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import numpy as np
+
+def nbytes(value):
+    """
+        bytes held by the arrays of a result (an array or a tuple/list of them)
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+def byte_cache(max_bytes, max_entries=None):
+    """
+        LRU memoisation decorator bounded by max_bytes of cached arrays
+
+        the wrapped function gets cache_clear() and cache_info() -> (entries, bytes),
+        and the uncached function stays available as __wrapped__
+    """
+    def decorate(function):
+        entries = OrderedDict()
+        size = 0
+        lock = Lock()
+
+        @wraps(function)
+        def cached(*args):
+            nonlocal size
+            with lock:
+                if args in entries:
+                    entries.move_to_end(args)
+                    return entries[args][0]
+            # computed outside the lock, concurrent misses of one key just compute twice
+            value = function(*args)
+            cost = nbytes(value)
+            if cost > max_bytes:
+                return value
+            with lock:
+                if args not in entries:
+                    entries[args] = (value, cost)
+                    size += cost
+                while size > max_bytes or (max_entries is not None and len(entries) > max_entries):
+                    _, (_, freed) = entries.popitem(last=False)
+                    size -= freed
+            return value
+
+        def cache_clear():
+            nonlocal size
+            with lock:
+                entries.clear()
+                size = 0
+
+        cached.cache_clear = cache_clear
+        cached.cache_info = lambda: (len(entries), size)
+        return cached
+    return decorate
@@ -0,0 +1,176 @@
+"""
+   Typed bindings for the WaveForms SDK (dwf) library
+
+   argtypes/restype are declared once for every function MyDigilent uses, so
+   calls take plain Python ints/floats and ctypes skips per-call type guessing.
+   A FALSE return is turned into an `error` exception by an errcheck hook,
+   there is no need to test the result of every call by hand.
+"""
+
+import ctypes
+from ctypes import c_int, c_uint, c_double, c_ubyte, c_char_p, c_void_p, POINTER
+from sys import platform
+from os import sep
+
+class error(Exception):
+    """
+        WaveForms SDK error
+    """
+    def __init__(self, message, function, instrument):
+        self.message = message
+        self.function = function
+        self.instrument = instrument
+        return
+    def __str__(self):
+        return "Error: " + self.instrument + " -> " + self.function + " -> " + self.message
+
+class warning(Exception):
+    """
+        WaveForms SDK warning, or non-fatal error
+    """
+    def __init__(self, message, function, instrument):
+        self.message = message
+        self.function = function
+        self.instrument = instrument
+        return
+    def __str__(self):
+        return "Warning: " + self.instrument + " -> " + self.function + " -> " + self.message
+
+HDWF = c_int
+_int_p = POINTER(c_int)
+_uint_p = POINTER(c_uint)
+_double_p = POINTER(c_double)
+
+# argument types of the SDK functions (all of them return a BOOL)
+PROTOTYPES = {
+    # library
+    "FDwfGetLastError":                  [_int_p],
+    "FDwfGetLastErrorMsg":               [c_char_p],
+    "FDwfGetVersion":                    [c_char_p],
+
+    # device enumeration and control
+    "FDwfEnum":                          [c_int, _int_p],
+    "FDwfEnumDeviceType":                [c_int, _int_p, _int_p],
+    "FDwfEnumSN":                        [c_int, c_char_p],
+    "FDwfEnumConfig":                    [c_int, _int_p],
+    "FDwfEnumConfigInfo":                [c_int, c_int, _int_p],
+    "FDwfDeviceConfigOpen":              [c_int, c_int, POINTER(HDWF)],
+    "FDwfDeviceClose":                   [HDWF],
+
+    # analog in
+    "FDwfAnalogInConfigure":             [HDWF, c_int, c_int],
+    "FDwfAnalogInStatus":                [HDWF, c_int, POINTER(c_ubyte)],
+    "FDwfAnalogInStatusData":            [HDWF, c_int, _double_p, c_int],
+    "FDwfAnalogInStatusRecord":          [HDWF, _int_p, _int_p, _int_p],
+    "FDwfAnalogInChannelCount":          [HDWF, _int_p],
+    "FDwfAnalogInBufferSizeInfo":        [HDWF, _int_p, _int_p],
+    "FDwfAnalogInBufferSizeSet":         [HDWF, c_int],
+    "FDwfAnalogInBitsInfo":              [HDWF, _int_p],
+    "FDwfAnalogInFrequencyInfo":         [HDWF, _double_p, _double_p],
+    "FDwfAnalogInFrequencySet":          [HDWF, c_double],
+    "FDwfAnalogInFrequencyGet":          [HDWF, _double_p],
+    "FDwfAnalogInAcquisitionModeSet":    [HDWF, c_int],
+    "FDwfAnalogInRecordLengthSet":       [HDWF, c_double],
+    "FDwfAnalogInChannelEnableSet":      [HDWF, c_int, c_int],
+    "FDwfAnalogInChannelRangeInfo":      [HDWF, _double_p, _double_p, _double_p],
+    "FDwfAnalogInChannelRangeSet":       [HDWF, c_int, c_double],
+    "FDwfAnalogInChannelOffsetInfo":     [HDWF, _double_p, _double_p, _double_p],
+    "FDwfAnalogInChannelOffsetSet":      [HDWF, c_int, c_double],
+
+    # analog out
+    "FDwfAnalogOutCount":                [HDWF, _int_p],
+    "FDwfAnalogOutNodeInfo":             [HDWF, c_int, _int_p],
+    "FDwfAnalogOutNodeDataInfo":         [HDWF, c_int, c_int, _int_p, _int_p],
+    "FDwfAnalogOutNodeAmplitudeInfo":    [HDWF, c_int, c_int, _double_p, _double_p],
+    "FDwfAnalogOutNodeOffsetInfo":       [HDWF, c_int, c_int, _double_p, _double_p],
+    "FDwfAnalogOutNodeFrequencyInfo":    [HDWF, c_int, c_int, _double_p, _double_p],
+    "FDwfAnalogOutNodeEnableSet":        [HDWF, c_int, c_int, c_int],
+    "FDwfAnalogOutNodeFunctionSet":      [HDWF, c_int, c_int, c_ubyte],
+    "FDwfAnalogOutNodeDataSet":          [HDWF, c_int, c_int, _double_p, c_int],
+    "FDwfAnalogOutNodeFrequencySet":     [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeAmplitudeSet":     [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeOffsetSet":        [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutConfigure":            [HDWF, c_int, c_int],
+    "FDwfAnalogOutReset":                [HDWF, c_int],
+
+    # analog IO
+    "FDwfAnalogIOChannelCount":          [HDWF, _int_p],
+    "FDwfAnalogIOChannelName":           [HDWF, c_int, c_char_p, c_char_p],
+    "FDwfAnalogIOChannelInfo":           [HDWF, c_int, _int_p],
+    "FDwfAnalogIOChannelNodeName":       [HDWF, c_int, c_int, c_char_p, c_char_p],
+    "FDwfAnalogIOChannelNodeSetInfo":    [HDWF, c_int, c_int, _double_p, _double_p, _int_p],
+    "FDwfAnalogIOChannelNodeStatusInfo": [HDWF, c_int, c_int, _double_p, _double_p, _int_p],
+
+    # digital in/out
+    "FDwfDigitalInBitsInfo":             [HDWF, _int_p],
+    "FDwfDigitalInBufferSizeInfo":       [HDWF, _int_p],
+    "FDwfDigitalOutCount":               [HDWF, _int_p],
+    "FDwfDigitalOutDataInfo":            [HDWF, c_int, _uint_p],
+
+    # UART
+    "FDwfDigitalUartReset":              [HDWF],
+    "FDwfDigitalUartRateSet":            [HDWF, c_double],
+    "FDwfDigitalUartBitsSet":            [HDWF, c_int],
+    "FDwfDigitalUartParitySet":          [HDWF, c_int],
+    "FDwfDigitalUartStopSet":            [HDWF, c_double],
+    "FDwfDigitalUartTxSet":              [HDWF, c_int],
+    "FDwfDigitalUartRxSet":              [HDWF, c_int],
+    "FDwfDigitalUartTx":                 [HDWF, c_void_p, c_int],
+    "FDwfDigitalUartRx":                 [HDWF, c_void_p, c_int, _int_p, _int_p],
+}
+
+# used by the errcheck hook itself, their result is never checked
+UNCHECKED = ("FDwfGetLastError", "FDwfGetLastErrorMsg")
+
+def _errcheck_for(lib):
+    """
+        returns an errcheck hook that raises `error` with the SDK message on a FALSE return
+    """
+    get_message = lib.FDwfGetLastErrorMsg
+    def errcheck(result, function, arguments):
+        if result == 0:
+            message = ctypes.create_string_buffer(512)
+            get_message(message)
+            raise error(message.value.decode("ascii").strip() or "unknown error", function.__name__, "dwf")
+        return result
+    return errcheck
+
+def bind(lib):
+    """
+        declares argtypes/restype/errcheck on the functions of a loaded dwf library
+    """
+    for name in UNCHECKED:
+        function = getattr(lib, name)
+        function.argtypes = PROTOTYPES[name]
+        function.restype = c_int
+    errcheck = _errcheck_for(lib)
+    for name, argtypes in PROTOTYPES.items():
+        if name in UNCHECKED:
+            continue
+        # ctypes caches the function object on the library, so this is done once
+        function = getattr(lib, name)
+        function.argtypes = argtypes
+        function.restype = c_int
+        function.errcheck = errcheck
+    return lib
+
+def library_path():
+    """
+        returns the OS specific name/path of the dwf library
+    """
+    if platform.startswith("win"):
+        return "dwf.dll"
+    elif platform.startswith("darwin"):
+        return sep + "Library" + sep + "Frameworks" + sep + "dwf.framework" + sep + "dwf"
+    return "libdwf.so"
+
+_dwf = None
+
+def load():
+    """
+        loads the dwf library and binds it, the same bound library is returned on later calls
+    """
+    global _dwf
+    if _dwf is None:
+        _dwf = bind(ctypes.cdll.LoadLibrary(library_path()))
+    return _dwf
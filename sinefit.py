@@ -0,0 +1,274 @@
+"""
+   Closed-form sine fitting (IEEE 1057 style)
+
+   3-parameter fit:  y = a*sin(wt) + b*cos(wt) + c at a known frequency, solved
+   from the 3x3 normal equations. The sin/cos vectors and the inverted normal
+   matrix only depend on (frequency, sample rate, length) and are cached (up to
+   BASIS_CACHE_BYTES), so a repeated fit costs three dot products.
+
+   4-parameter fit:  also estimates the frequency, by Gauss-Newton iterations
+   on the 3-parameter model.
+
+   estimate_frequency:  frequency of the strongest sine in a band, bracketed on
+   the DFT and refined by golden-section search on the 3-parameter fit amplitude;
+   both come from band_spectrum, the buffer reduced once to block moments around
+   the band, so every evaluation costs O(blocks) instead of O(N).
+"""
+
+import numpy as np
+from bytecache import byte_cache
+
+# a basis is two float64 vectors of the capture length, 16 MB at 2^20 samples
+BASIS_CACHE_BYTES = 64 * 2**20
+
+@byte_cache(BASIS_CACHE_BYTES)
+def basis(signal_freq, sample_rate, n_samples):
+    """
+    Cached sin/cos reference vectors and inverse normal matrix.
+
+    Returns
+    -------
+    sin_wt, cos_wt : read-only arrays of length n_samples
+    inverse        : inverse of the 3x3 normal matrix of [sin, cos, 1]
+    """
+    omega_t = 2 * np.pi * signal_freq * (np.arange(n_samples) / sample_rate)
+    sin_wt = np.sin(omega_t)
+    cos_wt = np.cos(omega_t)
+    s, c = sin_wt.sum(), cos_wt.sum()
+    ss, cc, sc = sin_wt @ sin_wt, cos_wt @ cos_wt, sin_wt @ cos_wt
+    normal = np.array([[ss, sc, s],
+                       [sc, cc, c],
+                       [s,  c,  n_samples]])
+    sin_wt.flags.writeable = False
+    cos_wt.flags.writeable = False
+    return sin_wt, cos_wt, np.linalg.inv(normal)
+
+def fit3(y_buffer, signal_freq, sample_rate, cache=True):
+    """
+    3-parameter sine fit at a known frequency.
+
+    Parameters
+    ----------
+    y_buffer    : samples, 1-D (n,) or batched (channels, n)
+    signal_freq : frequency of the sine (Hz)
+    sample_rate : sampling rate (Hz)
+    cache       : keep the basis for later fits at the same frequency; one-off
+                  frequencies (searches) should not evict the useful entries
+
+    Returns
+    -------
+    coeffs : (3,) or (channels, 3) array of [a, b, c] for
+             y = a*sin(wt) + b*cos(wt) + c
+    """
+    y = np.asarray(y_buffer, dtype=float)
+    make_basis = basis if cache else basis.__wrapped__
+    return project(y, make_basis(float(signal_freq), float(sample_rate), y.shape[-1]))
+
+def project(y_buffer, sine_basis):
+    """
+    fit3 against a basis already at hand (as returned by basis()).
+    """
+    sin_wt, cos_wt, inverse = sine_basis
+    y = np.asarray(y_buffer, dtype=float)
+    rhs = np.stack([y @ sin_wt, y @ cos_wt, y.sum(axis=-1)], axis=-1)
+    return rhs @ inverse.T
+
+def amplitude_phase(coeffs):
+    """
+    Amplitude, phase (rad, relative to the sine reference) and offset of fit3 coefficients.
+    """
+    coeffs = np.asarray(coeffs)
+    a, b, c = coeffs[..., 0], coeffs[..., 1], coeffs[..., 2]
+    return np.sqrt(a**2 + b**2), np.arctan2(b, a), c
+
+def fit4(y_buffer, signal_freq, sample_rate, iterations=20, tolerance=1e-9):
+    """
+    4-parameter sine fit: estimates the frequency, starting from an initial guess
+    (which should be within a fraction of a bin, e.g. an FFT peak).
+
+    Parameters
+    ----------
+    y_buffer    : samples, 1-D
+    signal_freq : initial frequency estimate (Hz)
+    sample_rate : sampling rate (Hz)
+    iterations  : maximum Gauss-Newton iterations
+    tolerance   : relative frequency change at which the iteration stops
+
+    Returns
+    -------
+    frequency (Hz), coeffs [a, b, c] as in fit3
+    """
+    y = np.asarray(y_buffer, dtype=float)
+    n = y.size
+    t = np.arange(n) / sample_rate
+    # the starting frequency is a guess, its basis is not worth keeping
+    coeffs = fit3(y, signal_freq, sample_rate, cache=False)
+    frequency = float(signal_freq)
+    for _ in range(iterations):
+        a, b, _c = coeffs
+        omega_t = 2 * np.pi * frequency * t
+        sin_wt, cos_wt = np.sin(omega_t), np.cos(omega_t)
+        # derivative of the model with respect to the angular frequency
+        d_omega = t * (a * cos_wt - b * sin_wt)
+        columns = np.stack((sin_wt, cos_wt, np.ones(n), d_omega))
+        a, b, c, delta_omega = np.linalg.solve(columns @ columns.T, columns @ y)
+        coeffs = np.array([a, b, c])
+        step = delta_omega / (2 * np.pi)
+        frequency += step
+        if abs(step) <= tolerance * abs(frequency):
+            break
+    return frequency, coeffs
+
+GOLDEN = (np.sqrt(5) - 1) / 2
+# largest phase drift (rad) of a frequency offset across one block of band_spectrum,
+# the Taylor terms kept then leave a relative error below 1e-9
+BAND_BLOCK_PHASE = 0.05
+BAND_MOMENTS = 5
+# bands of up to this many DFT bins are bracketed from band_spectrum, wider ones by rfft
+BAND_BRACKET_BINS = 32
+
+def _geometric(omega, n):
+    """sum of exp(j omega k) for k < n"""
+    half = np.sin(omega / 2)
+    if abs(half) < 1e-12:
+        return complex(n)
+    return np.exp(0.5j * omega * (n - 1)) * np.sin(omega * n / 2) / half
+
+def band_spectrum(y_buffer, low, high, sample_rate):
+    """
+    DFT of y at any frequency in [low, high] in O(N / block) per frequency.
+
+    y is mixed down to the band centre and summed in blocks short enough that
+    a frequency offset turns by at most BAND_BLOCK_PHASE across one; the offset's
+    phase inside a block is expanded in BAND_MOMENTS Taylor terms, so only the
+    first moments of every block are kept.
+
+    Returns
+    -------
+    dft(frequency) -> sum of y[n] exp(-j 2 pi frequency n / sample_rate), for a
+                      frequency or an array of them
+    """
+    y = np.asarray(y_buffer, dtype=float)
+    n = y.size
+    centre = (low + high) / 2
+    reach = 2 * np.pi * max(high - centre, centre - low) / sample_rate
+    block = int(min(n, max(1, BAND_BLOCK_PHASE / reach))) if reach > 0 else n
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block)
+    padded[:n] = y
+    # mixing phase of sample b * block + k split into a block and an in-block part,
+    # so the moments are two real (blocks, block) @ (block, moments) products
+    omega = 2 * np.pi * centre / sample_rate
+    k = np.arange(block, dtype=float)
+    weights = np.exp(-1j * omega * k)[:, np.newaxis] * np.stack([k ** m for m in range(BAND_MOMENTS)], axis=1)
+    rows = padded.reshape(blocks, block)
+    starts = np.arange(blocks) * block
+    moments = np.exp(-1j * omega * starts)[:, np.newaxis] * (rows @ weights.real + 1j * (rows @ weights.imag))
+    factorials = np.cumprod(np.concatenate(([1.0], np.arange(1.0, BAND_MOMENTS))))
+
+    def dft(frequency):
+        delta = 2 * np.pi * (np.asarray(frequency, dtype=float)[..., np.newaxis] - centre) / sample_rate
+        taylor = (-1j * delta) ** np.arange(BAND_MOMENTS) / factorials
+        return np.sum((np.exp(-1j * delta * starts) @ moments) * taylor, axis=-1)
+    return dft
+
+def band_amplitude(y_buffer, low, high, sample_rate, dft=None):
+    """
+    fit3 amplitude (a^2 + b^2) at any frequency in [low, high], from band_spectrum
+    and the closed-form sums of the normal matrix instead of length-N references.
+
+    Returns
+    -------
+    amplitude(frequency) -> a^2 + b^2
+    """
+    y = np.asarray(y_buffer, dtype=float)
+    n = y.size
+    total = y.sum()
+    if dft is None:
+        dft = band_spectrum(y, low, high, sample_rate)
+
+    def amplitude(frequency):
+        omega = 2 * np.pi * frequency / sample_rate
+        g1, g2 = _geometric(omega, n), _geometric(2 * omega, n)
+        normal = np.array([[(n - g2.real) / 2, g2.imag / 2, g1.imag],
+                           [g2.imag / 2, (n + g2.real) / 2, g1.real],
+                           [g1.imag, g1.real, n]])
+        spectrum = dft(frequency)
+        a, b, _ = np.linalg.solve(normal, [-spectrum.imag, spectrum.real, total])
+        return a * a + b * b
+    return amplitude
+
+def estimate_frequency(y_buffer, freq_sweep, sample_rate, tolerance=None):
+    """
+    Frequency of the strongest sine inside a band, in O(log(1/tolerance)) fits.
+
+    The peak is bracketed on the Hann-windowed DFT (parabolic interpolation of the
+    log magnitude around the largest bin) and refined by golden-section search on
+    the 3-parameter fit amplitude, the same criterion freq_selection_signal scans.
+    Both are evaluated from band_spectrum, one pass over the buffer; only bands
+    wider than BAND_BRACKET_BINS bins take a full rfft for the bracket. Bands
+    narrower than two DFT bins, or outside the DFT bins, are searched directly.
+
+    Parameters
+    ----------
+    y_buffer    : samples, 1-D
+    freq_sweep  : [start_freq, stop_freq] of the band (Hz)
+    sample_rate : sampling rate (Hz)
+    tolerance   : width (Hz) of the final bracket, default 1e-6 of the band centre
+
+    Returns
+    -------
+    frequency (Hz)
+    """
+    y = np.asarray(y_buffer, dtype=float)
+    n = y.size
+    low, high = float(freq_sweep[0]), float(freq_sweep[1])
+    if tolerance is None:
+        tolerance = 1e-6 * (low + high) / 2
+    bin_width = sample_rate / n
+    first = max(int(np.ceil(low / bin_width)), 1)
+    last = min(int(np.floor(high / bin_width)), n // 2 - 1)
+    dft = None
+
+    if high - low >= 2 * bin_width and first <= last:
+        bins = np.arange(first - 1, last + 2)
+        if bins.size <= BAND_BRACKET_BINS + 2:
+            # Hann window 0.5 - 0.5 cos(theta k), theta = 2 pi / (n - 1) (np.hanning),
+            # applied as shifts of the spectrum of y minus its mean
+            theta = 2 * np.pi / (n - 1)
+            shift = theta * sample_rate / (2 * np.pi)
+            dft = band_spectrum(y, bins[0] * bin_width - shift, bins[-1] * bin_width + shift, sample_rate)
+            mean = y.mean()
+            def centred(frequency):
+                omega = 2 * np.pi * frequency / sample_rate
+                return dft(frequency) - mean * np.conj(_geometric(omega, n))
+            spectrum = np.abs([0.5 * centred(f) - 0.25 * centred(f - shift) - 0.25 * centred(f + shift)
+                               for f in bins * bin_width])
+        else:
+            spectrum = np.abs(np.fft.rfft((y - y.mean()) * np.hanning(n)))[bins]
+        k = 1 + int(np.argmax(spectrum[1:-1]))
+        # parabolic interpolation of the log magnitude (Gaussian peak model)
+        alpha, beta, gamma = np.log(spectrum[k - 1:k + 2] + np.finfo(float).tiny)
+        denominator = alpha - 2 * beta + gamma
+        delta = 0.5 * (alpha - gamma) / denominator if denominator != 0 else 0.0
+        centre = (bins[k] + np.clip(delta, -0.5, 0.5)) * bin_width
+        low, high = max(low, centre - bin_width), min(high, centre + bin_width)
+        if bins.size > BAND_BRACKET_BINS + 2:
+            dft = None
+
+    amplitude = band_amplitude(y, low, high, sample_rate, dft)
+
+    # golden-section search for the amplitude maximum
+    x1 = high - GOLDEN * (high - low)
+    x2 = low + GOLDEN * (high - low)
+    a1, a2 = amplitude(x1), amplitude(x2)
+    while high - low > tolerance:
+        if a1 < a2:
+            low, x1, a1 = x1, x2, a2
+            x2 = low + GOLDEN * (high - low)
+            a2 = amplitude(x2)
+        else:
+            high, x2, a2 = x2, x1, a1
+            x1 = high - GOLDEN * (high - low)
+            a1 = amplitude(x1)
+    return (low + high) / 2